@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'food_ordering.settings')
+# Read by the settings, which turn off persistent database connections.
+os.environ['SERVER_MODE'] = 'asgi'
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'store.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,14 +51,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'store.middleware.StaticFilesMiddleware',
 ]
 
 ROOT_URLCONF = 'food_ordering.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render time reported to PerformanceMiddleware
+        'BACKEND': 'store.templating.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,13 +77,93 @@ WSGI_APPLICATION = 'food_ordering.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# DB_ENGINE=sqlite (default) runs on the bundled SQLite file, tuned for a
+# multi-worker gunicorn deployment. DB_ENGINE=postgresql switches to a
+# server database configured from DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/
+# DB_PORT, with a psycopg connection pool when DB_POOL_MAX_SIZE is set.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'food_ordering'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # Pooled connections must not also be persistent (CONN_MAX_AGE=0).
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+            },
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Keep connections open between requests instead of reopening
+            # the file (and re-running the pragmas below) every time.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock when a transaction starts so concurrent
+                # checkouts queue on the busy timeout instead of failing with
+                # "database is locked" when upgrading a read lock.
+                'transaction_mode': 'IMMEDIATE',
+                # Seconds a writer waits for the lock before giving up.
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+                # Run on every new connection. WAL lets readers proceed while
+                # a write is in progress; synchronous=NORMAL is durable in
+                # WAL mode except across power loss, and skips an fsync per
+                # commit.
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            # A file-backed test database so concurrency tests can use real
+            # per-thread connections (in-memory shared cache has table locks).
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+# Under ASGI every request runs its queries on its own executor thread, so a
+# persistent connection is never reused and they only pile up. food_ordering.asgi
+# sets SERVER_MODE=asgi.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+if SERVER_MODE == 'asgi':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
 
-DATABASES = {
+# Cache
+# The menu catalog (store.catalog) is invalidated by bumping a version kept in
+# the database. Each process caches the version for STORE_CATALOG_VERSION_TTL
+# seconds, so with the per-process default cache a menu edit or a cron restock
+# reaches every worker within that time. A shared backend (e.g. Redis) also
+# shares the catalog itself between workers.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
     }
 }
+STORE_CATALOG_VERSION_TTL = int(os.environ.get('STORE_CATALOG_VERSION_TTL', 5))
 
 
 # Password validation
@@ -129,3 +213,55 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Uploads are served by store.media.serve with content-hashed names.
+STORE_MEDIA_MAX_AGE = 3600  # seconds, for files stored before names were hashed
+
+STORAGES = {
+    'default': {'BACKEND': 'store.storage.MediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Flash messages live in a cookie, not the session, so rendering them from an
+# async view never needs a session query.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Generated invoice PDFs (kept out of MEDIA_ROOT so they are not public)
+INVOICE_ROOT = BASE_DIR / 'invoices'
+
+# Store maintenance
+# Carts untouched for this many days are removed by `manage.py purge_carts`.
+STORE_CART_TTL_DAYS = int(os.environ.get('STORE_CART_TTL_DAYS', 30))
+# Seconds between in-process cart purges; unset to rely on the command (cron) only.
+STORE_CART_GC_INTERVAL = int(os.environ.get('STORE_CART_GC_INTERVAL', 0)) or None
+
+# Order notifications (store.notifications). Mail goes out through the
+# usual EMAIL_* settings, from an outbox written with each order.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '0') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'orders@localhost')
+# Addresses that get a ticket for every order; empty sends none.
+STORE_KITCHEN_EMAILS = [address for address in os.environ.get('STORE_KITCHEN_EMAILS', '').split(',') if address]
+# Seconds between in-process outbox runs; unset to rely on `manage.py run_outbox_dispatcher`.
+STORE_OUTBOX_INTERVAL = int(os.environ.get('STORE_OUTBOX_INTERVAL', 0)) or None
+STORE_OUTBOX_BATCH_SIZE = 50
+STORE_OUTBOX_MAX_ATTEMPTS = 8
+
+# Live order status (store.status_feed): seconds between the shared poll for
+# changes made in other processes, and the longest a long poll waits.
+STORE_ORDER_STATUS_POLL = float(os.environ.get('STORE_ORDER_STATUS_POLL', 2))
+STORE_ORDER_STATUS_TIMEOUT = 25
+
+# Group-commit order intake (store.intake): checkouts are queued and written
+# by one thread per process, up to BATCH_SIZE orders per transaction. It only
+# batches when a process serves several checkouts at once (SERVER_MODE=asgi
+# or threaded workers); sync workers gain nothing from it.
+STORE_ORDER_INTAKE = os.environ.get('STORE_ORDER_INTAKE', '0') == '1'
+STORE_ORDER_INTAKE_BATCH_SIZE = int(os.environ.get('STORE_ORDER_INTAKE_BATCH_SIZE', 50))
+# Seconds the writer waits for more orders after the first one of a batch.
+STORE_ORDER_INTAKE_MAX_WAIT = float(os.environ.get('STORE_ORDER_INTAKE_MAX_WAIT', 0.005))
+# Seconds a checkout waits for its batch to commit.
+STORE_ORDER_INTAKE_TIMEOUT = 10
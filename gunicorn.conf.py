@@ -0,0 +1,54 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+``SERVER_MODE=wsgi`` (the default) serves ``food_ordering.wsgi`` with sync
+workers, which handle the mostly cached pages fastest. ``SERVER_MODE=asgi``
+opts in to ``food_ordering.asgi`` on uvicorn workers, so the async views only
+hold a worker while they compute; it pays off when requests wait on the
+database or on PDF rendering, and is needed for live order status streams.
+Worker count comes from ``WEB_CONCURRENCY`` as usual.
+
+The application is imported once in the master (``preload_app``) and warmed
+up there (``store.warmup``), so forked workers start with modules, URL
+tables and compiled templates already in memory. Set ``SERVER_PRELOAD=0`` to
+load and warm up in each worker instead.
+
+Unless told otherwise, the web workers also send queued order emails in the
+background, so a deployment without a separate ``run_outbox_dispatcher``
+process still delivers them. Invoice PDFs are CPU-bound and are left to the
+``run_invoice_worker`` process (see procfile and render.yaml).
+"""
+import os
+
+os.environ.setdefault('STORE_OUTBOX_INTERVAL', '10')
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'food_ordering.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'food_ordering.wsgi:application'
+    worker_class = 'sync'
+else:
+    raise RuntimeError(f"SERVER_MODE must be 'asgi' or 'wsgi', not {SERVER_MODE!r}")
+
+preload_app = os.environ.get('SERVER_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any fork.
+    if preload_app:
+        _warm_up(server.log)
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up(worker.log)
+
+
+def _warm_up(log):
+    from store.warmup import warm_up
+
+    timings = warm_up()
+    log.info("Warmed up: urls %.1f ms, templates %.1f ms", timings['urls'] * 1000, timings['templates'] * 1000)
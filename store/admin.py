@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Category, MenuItem, Cart, CartItem, Order, OrderItem
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import F
+
+from . import catalog, exports, status_feed
+from .models import Category, MenuItem, Cart, CartItem, Order, OrderItem, OutboxMessage
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -8,8 +13,19 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'category', 'price', 'gst_rate', 'is_active')
+    list_display = ('id', 'name', 'category', 'price', 'gst_rate', 'is_active', 'stock', 'daily_stock')
     list_filter = ('category', 'is_active')
+    # Checkout decrements stock with F() updates; saving a form would write
+    # back the value it was loaded with and undo sales made in between.
+    readonly_fields = ('stock',)
+    actions = ['restock']
+
+    @admin.action(description="Restock selected items to their daily stock")
+    def restock(self, request, queryset):
+        restocked = queryset.filter(daily_stock__isnull=False).update(stock=F('daily_stock'))
+        # update() skips post_save, so bump the catalog version directly.
+        transaction.on_commit(catalog.invalidate)
+        self.message_user(request, f"Restocked {restocked} item(s).", messages.SUCCESS)
 
 
 @admin.register(Cart)
@@ -22,18 +38,84 @@ class CartItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'cart', 'product', 'quantity')
 
 
+class OrderStatusFilter(admin.SimpleListFilter):
+    # Lists Order.STATUS_FLOW instead of running SELECT DISTINCT over the table.
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return [(status, status) for status in Order.STATUS_FLOW]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(status=self.value())
+        return queryset
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    # Lines keep the price they were sold at; read-only fields also avoid a
+    # product <select> (or raw-id lookup) per line.
+    fields = readonly_fields = ('product', 'quantity', 'price', 'gst_rate')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+# The order tables grow without bound: no per-row foreign key lookups,
+# no COUNT(*) over the whole table (see EstimatedCountPaginator), and
+# filters that are served by the indexes on Order.
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'full_name', 'email', 'total_amount', 'status', 'payment_status', 'created_at')
+    list_filter = (OrderStatusFilter, 'payment_status')
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('user',)
+    inlines = [OrderItemInline]
+    actions = ['advance_status', 'export_csv']
+
+    @admin.action(description="Export selected orders as CSV")
+    def export_csv(self, request, queryset):
+        return exports.orders_csv_response(request, queryset)
+
+    @admin.action(description="Advance selected orders to the next status")
+    def advance_status(self, request, queryset):
+        advanced = []
+        # Last step first, so an order only moves once.
+        steps = list(zip(Order.STATUS_FLOW, Order.STATUS_FLOW[1:]))
+        for current, following in reversed(steps):
+            ids = list(queryset.filter(status=current).values_list('id', flat=True))
+            if ids and Order.objects.filter(id__in=ids, status=current).update(status=following):
+                advanced += [(order_id, following) for order_id in ids]
+
+        def publish():
+            # update() skips post_save, so tell waiting customers directly.
+            for order_id, status in advanced:
+                status_feed.notifier.publish(order_id, status)
+
+        transaction.on_commit(publish)
+        self.message_user(request, f"Advanced {len(advanced)} order(s).", messages.SUCCESS)
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'product', 'quantity', 'price', 'gst_rate')
+    list_select_related = ('order', 'product')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ('order', 'product')
 
 
-
-
-
-
-
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'kind', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    raw_id_fields = ('order',)
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+
+
+def start_background_jobs(**kwargs):
+    from . import carts, jobs, notifications
+
+    interval = getattr(settings, 'STORE_CART_GC_INTERVAL', None)
+    if interval:
+        jobs.run_periodically('purge_carts', interval, carts.purge_idle_carts)
+    interval = getattr(settings, 'STORE_OUTBOX_INTERVAL', None)
+    if interval:
+        jobs.run_periodically('dispatch_outbox', interval, notifications.dispatch_pending)
 
 
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        request_started.connect(start_background_jobs, dispatch_uid='store.start_background_jobs')
+        if getattr(settings, 'STORE_PERFORMANCE_METRICS', True):
+            from .middleware import install_query_timer
+
+            connection_created.connect(install_query_timer, dispatch_uid='store.install_query_timer')
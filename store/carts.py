@@ -0,0 +1,401 @@
+"""
+Cart backends.
+
+``get_cart(request)`` returns the cart for a request behind one interface:
+
+* ``DatabaseCart`` keeps lines in ``Cart``/``CartItem``. Signed-in users
+  always use it so their cart follows them between devices.
+* ``SessionCart`` keeps a guest's cart in the session as a compact
+  ``{product_id: quantity}`` mapping and prices it from the catalog cache,
+  so browsing guests never write to the cart tables. Point
+  ``SESSION_ENGINE`` at a cache backend to keep it off the database
+  entirely. The lines only reach the database as an ``Order`` at checkout,
+  or as a ``Cart`` when the guest signs in (``merge_guest_cart``).
+
+The guest backend is chosen with ``STORE_GUEST_CART_BACKEND`` (a dotted
+path, ``store.carts.SessionCart`` by default).
+
+Database mutations are single conditional ``UPDATE`` statements (or an
+upsert backed by the unique (cart, product) constraint), so quantities are
+never read into Python and written back and double clicks both count.
+"""
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import catalog, intake, orders, pricing
+from .models import Cart, CartItem
+
+CartLine = namedtuple('CartLine', 'product quantity line_total')
+
+TOUCH_INTERVAL = timedelta(hours=1)
+# Largest quantity a single cart line may be set to.
+MAX_QUANTITY = 99
+
+
+# ---------------- Database operations ---------------- #
+def increment(cart, product_id, step=1, create=True):
+    lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+    if lines.update(quantity=F('quantity') + step):
+        return True
+    if not create:
+        return False
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, product_id=product_id, quantity=step)
+    except IntegrityError:
+        # Another request inserted the line first.
+        lines.update(quantity=F('quantity') + step)
+    return True
+
+
+def decrement(cart, product_id, remove_last=True):
+    """
+    Take one off the line. The last unit is removed when ``remove_last``
+    is set, otherwise the line stays at a quantity of one.
+    """
+    lines = CartItem.objects.filter(cart=cart, product_id=product_id)
+    if lines.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+        return
+    if remove_last:
+        lines.filter(quantity__lte=1).delete()
+
+
+def remove(cart, product_id):
+    return CartItem.objects.filter(cart=cart, product_id=product_id).delete()[0]
+
+
+def set_quantities(cart, quantities):
+    """
+    Apply a batch of absolute quantities (product id -> quantity) in at
+    most two statements. A quantity of zero removes the line.
+    """
+    upserts = [
+        CartItem(cart=cart, product_id=product_id, quantity=quantity)
+        for product_id, quantity in quantities.items()
+        if quantity > 0
+    ]
+    removals = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+    with transaction.atomic():
+        if upserts:
+            CartItem.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+        if removals:
+            CartItem.objects.filter(cart=cart, product_id__in=removals).delete()
+
+
+def touch(cart):
+    """
+    Record activity on ``cart`` for garbage collection. Only writes when the
+    stored timestamp is older than ``TOUCH_INTERVAL``, so most clicks cost
+    nothing extra.
+    """
+    now = timezone.now()
+    if cart.updated_at is None or cart.updated_at < now - TOUCH_INTERVAL:
+        Cart.objects.filter(id=cart.id).update(updated_at=now)
+        cart.updated_at = now
+
+
+def _totals(lines):
+    return pricing.totals_for_lines(
+        (line.product.price, line.quantity, line.product.gst_rate) for line in lines
+    )
+
+
+# ---------------- Backends ---------------- #
+class DatabaseCart:
+    """
+    Cart stored in ``Cart``/``CartItem``, keyed by user or, for guests, by
+    session key. The ``Cart`` row is only created on the first change.
+    A guest cart's id is also kept in the session, which survives the new
+    session key that signing in brings, so ``merge_guest_cart`` can find it.
+    """
+
+    guest_cart_key = 'guest_cart'
+
+    def __init__(self, request):
+        self.request = request
+        self._cart = None
+
+    def get_cart(self, create=False):
+        if self._cart is None:
+            user = self.request.user
+            session = self.request.session
+            if user.is_authenticated:
+                lookup = {'user': user}
+            else:
+                if session.session_key is None:
+                    if not create:
+                        return None
+                    session.create()
+                lookup = {'session_key': session.session_key}
+            if create:
+                self._cart, _ = Cart.objects.get_or_create(**lookup)
+                if not user.is_authenticated and session.get(self.guest_cart_key) != self._cart.id:
+                    session[self.guest_cart_key] = self._cart.id
+            else:
+                self._cart = Cart.objects.filter(**lookup).first()
+        return self._cart
+
+    def _changing(self, create=False):
+        cart = self.get_cart(create)
+        if cart is not None:
+            touch(cart)
+        return cart
+
+    def add(self, product_id, step=1, create=True):
+        cart = self._changing(create)
+        return cart is not None and increment(cart, product_id, step, create)
+
+    def decrement(self, product_id, remove_last=True):
+        cart = self._changing()
+        if cart is not None:
+            decrement(cart, product_id, remove_last)
+
+    def remove(self, product_id):
+        cart = self._changing()
+        return bool(cart and remove(cart, product_id))
+
+    def set_quantities(self, quantities):
+        set_quantities(self._changing(create=True), quantities)
+
+    def lines(self):
+        cart = self.get_cart()
+        if cart is None:
+            return []
+        items = pricing.with_line_totals(
+            CartItem.objects.filter(cart=cart).select_related('product').order_by('id'),
+            'product__price',
+        )
+        return [CartLine(item.product, item.quantity, item.line_total) for item in items]
+
+    def contents(self):
+        lines = self.lines()
+        return lines, _totals(lines)
+
+    async def acontents(self):
+        # One query joining through Cart instead of fetching the cart first.
+        user = await self.request.auser()
+        if user.is_authenticated:
+            lookup = {'cart__user': user}
+        elif self.request.session.session_key is not None:
+            lookup = {'cart__session_key': self.request.session.session_key}
+        else:
+            return [], _totals([])
+        items = pricing.with_line_totals(
+            CartItem.objects.filter(**lookup).select_related('product').order_by('id'),
+            'product__price',
+        )
+        lines = [CartLine(item.product, item.quantity, item.line_total) async for item in items]
+        return lines, _totals(lines)
+
+    def totals(self):
+        cart = self.get_cart()
+        if cart is None:
+            return pricing.summarise({})
+        return pricing.cart_totals(CartItem.objects.filter(cart=cart))
+
+    def take_guest_quantities(self):
+        """Remove the guest cart and return its ``{product_id: quantity}``."""
+        cart_id = self.request.session.pop(self.guest_cart_key, None)
+        if cart_id is None:
+            return {}
+        lines = CartItem.objects.filter(cart_id=cart_id, cart__user=None)
+        quantities = dict(lines.values_list('product_id', 'quantity'))
+        Cart.objects.filter(id=cart_id, user=None).delete()
+        return quantities
+
+    def place_order(self, order):
+        cart = self.get_cart()
+        if cart is None:
+            raise orders.EmptyCartError
+        if intake.enabled():
+            items = list(CartItem.objects.filter(cart=cart).select_related('product'))
+            return intake.place(order, items, [item.pk for item in items])
+        return orders.place_order(order, cart)
+
+
+class SessionCart:
+    """Guest cart kept in the session as ``{product_id: quantity}``."""
+
+    session_key = 'cart'
+
+    def __init__(self, request):
+        self.session = request.session
+
+    @property
+    def quantities(self):
+        # JSON session serialisation turns keys into strings.
+        return self.session.get(self.session_key, {})
+
+    def _save(self, quantities):
+        if quantities:
+            self.session[self.session_key] = quantities
+        else:
+            self.session.pop(self.session_key, None)
+
+    def add(self, product_id, step=1, create=True):
+        quantities = self.quantities
+        key = str(product_id)
+        if key not in quantities and not create:
+            return False
+        quantities[key] = quantities.get(key, 0) + step
+        self._save(quantities)
+        return True
+
+    def decrement(self, product_id, remove_last=True):
+        quantities = self.quantities
+        key = str(product_id)
+        if key not in quantities:
+            return
+        if quantities[key] > 1:
+            quantities[key] -= 1
+        elif remove_last:
+            del quantities[key]
+        self._save(quantities)
+
+    def remove(self, product_id):
+        quantities = self.quantities
+        removed = quantities.pop(str(product_id), None) is not None
+        if removed:
+            self._save(quantities)
+        return removed
+
+    def set_quantities(self, quantities):
+        merged = self.quantities
+        for product_id, quantity in quantities.items():
+            if quantity > 0:
+                merged[str(product_id)] = quantity
+            else:
+                merged.pop(str(product_id), None)
+        self._save(merged)
+
+    def clear(self):
+        self._save({})
+
+    def lines(self):
+        by_id = catalog.get_catalog().by_id
+        lines = []
+        for product_id, quantity in self.quantities.items():
+            product = by_id.get(int(product_id))
+            # Items withdrawn from the menu drop out of the cart.
+            if product is not None:
+                lines.append(CartLine(product, quantity, product.price * quantity))
+        return lines
+
+    def contents(self):
+        lines = self.lines()
+        return lines, _totals(lines)
+
+    async def acontents(self):
+        quantities = await self.session.aget(self.session_key, {})
+        by_id = (await catalog.aget_catalog()).by_id
+        lines = []
+        for product_id, quantity in quantities.items():
+            product = by_id.get(int(product_id))
+            if product is not None:
+                lines.append(CartLine(product, quantity, product.price * quantity))
+        return lines, _totals(lines)
+
+    def totals(self):
+        return _totals(self.lines())
+
+    def take_guest_quantities(self):
+        quantities = {int(product_id): quantity for product_id, quantity in self.quantities.items()}
+        self.clear()
+        return quantities
+
+    def place_order(self, order):
+        if intake.enabled():
+            order = intake.place(order, self.lines())
+        else:
+            order = orders.place_order_from_lines(order, self.lines())
+        self.clear()
+        return order
+
+
+def guest_cart(request):
+    backend = getattr(settings, 'STORE_GUEST_CART_BACKEND', 'store.carts.SessionCart')
+    return import_string(backend)(request)
+
+
+def get_cart(request):
+    if request.user.is_authenticated:
+        return DatabaseCart(request)
+    return guest_cart(request)
+
+
+async def aget_cart(request):
+    if (await request.auser()).is_authenticated:
+        return DatabaseCart(request)
+    return guest_cart(request)
+
+
+def merge_guest_cart(request, user):
+    """Move a guest's cart, from the configured backend, into the user's database cart on sign-in."""
+    with transaction.atomic():
+        quantities = guest_cart(request).take_guest_quantities()
+        if quantities:
+            by_id = catalog.get_catalog().by_id
+            quantities = {product_id: quantity for product_id, quantity in quantities.items() if product_id in by_id}
+        if not quantities:
+            return
+        cart, _ = Cart.objects.get_or_create(user=user)
+        for product_id, quantity in CartItem.objects.filter(
+            cart=cart, product_id__in=quantities
+        ).values_list('product_id', 'quantity'):
+            quantities[product_id] += quantity
+        set_quantities(cart, quantities)
+
+
+# ---------------- Garbage collection ---------------- #
+def _freelist_bytes():
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA freelist_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def purge_idle_carts(ttl=None, chunk_size=500, pause=0):
+    """
+    Delete carts (and their lines) untouched for longer than ``ttl``
+    (default ``STORE_CART_TTL_DAYS`` days), ``chunk_size`` carts per
+    transaction so the write lock is only held briefly. Returns
+    ``(carts, lines, bytes)``; ``bytes`` is the space returned to the SQLite
+    freelist for reuse, or None on other databases.
+    """
+    if ttl is None:
+        ttl = timedelta(days=getattr(settings, 'STORE_CART_TTL_DAYS', 30))
+    cutoff = timezone.now() - ttl
+    idle = Cart.objects.filter(updated_at__lt=cutoff)
+    freelist_before = _freelist_bytes()
+    carts = lines = 0
+    while True:
+        ids = list(idle.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            # Re-check the cutoff so a cart touched since the select survives.
+            _, deleted = idle.filter(id__in=ids).delete()
+        carts += deleted.get('store.Cart', 0)
+        lines += deleted.get('store.CartItem', 0)
+        if len(ids) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    freelist_after = _freelist_bytes()
+    reclaimed = None if freelist_before is None else freelist_after - freelist_before
+    return carts, lines, reclaimed
@@ -0,0 +1,138 @@
+"""
+Versioned cache of the active menu.
+
+The catalog (active menu items with their categories) is stored in the Django
+cache under a key that embeds a version number. Saving or deleting a
+``MenuItem`` or ``Category`` bumps the version (see ``store.signals``), so
+every worker moves on to a fresh key instead of trying to delete stale ones.
+
+The version lives in the database (``CatalogVersion``) and each process
+keeps a copy in the cache for ``STORE_CATALOG_VERSION_TTL`` seconds. A bump
+from another process, such as another worker with its own LocMemCache or
+``restock_menu`` run from cron, is therefore seen within that time.
+
+Entries carry a soft expiry. When it passes, one worker takes a short lock
+and refills the entry while the others keep serving the stale copy, so an
+expiry never sends every request to the database at once.
+
+Async views use ``aget_catalog()``, which answers fresh hits from the cache's
+async API and hands everything else to ``get_catalog()`` on a thread.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import CatalogVersion, Category, MenuItem
+
+VERSION_KEY = 'store:catalog:version'
+CATALOG_TIMEOUT = getattr(settings, 'STORE_CATALOG_TIMEOUT', 300)
+# Stale entries are kept this long past their soft expiry for other workers to serve.
+STALE_GRACE = 60
+LOCK_TIMEOUT = 10
+# How long a worker waits on a cold key for the lock holder to fill it.
+FILL_WAIT = 2.0
+FILL_POLL = 0.05
+
+
+class Catalog:
+    def __init__(self, version, items, categories):
+        self.version = version
+        self.items = items
+        self.categories = categories
+        self.by_id = {item.id: item for item in items}
+        self.expires_at = time.time() + CATALOG_TIMEOUT
+
+    @property
+    def is_stale(self):
+        return time.time() >= self.expires_at
+
+
+def _cache_version(version):
+    cache.set(VERSION_KEY, version, getattr(settings, 'STORE_CATALOG_VERSION_TTL', 5))
+    return version
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _cache_version(CatalogVersion.objects.values_list('version', flat=True).first() or 0)
+    return version
+
+
+def invalidate():
+    versions = CatalogVersion.objects.filter(pk=1)
+    if not versions.update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    _cache_version(versions.values_list('version', flat=True).get())
+
+
+def _catalog_key(version):
+    return f'store:catalog:{version}'
+
+
+def _build(version):
+    items = list(
+        MenuItem.objects.filter(is_active=True).select_related('category').order_by('id')
+    )
+    categories = list(Category.objects.order_by('name'))
+    return Catalog(version, items, categories)
+
+
+def _refill(key, version):
+    catalog = _build(version)
+    cache.set(key, catalog, CATALOG_TIMEOUT + STALE_GRACE)
+    return catalog
+
+
+def get_catalog():
+    version = get_version()
+    key = _catalog_key(version)
+    catalog = cache.get(key)
+    if catalog is not None and not catalog.is_stale:
+        return catalog
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return _refill(key, version)
+        finally:
+            cache.delete(lock_key)
+
+    # Another worker is refilling this key.
+    if catalog is not None:
+        return catalog
+    deadline = time.time() + FILL_WAIT
+    while time.time() < deadline:
+        time.sleep(FILL_POLL)
+        catalog = cache.get(key)
+        if catalog is not None:
+            return catalog
+    return _build(version)
+
+
+def get_item(item_id):
+    """Return the active menu item with this id, or None."""
+    return get_catalog().by_id.get(item_id)
+
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = await sync_to_async(get_version)()
+    return version
+
+
+async def aget_catalog():
+    version = await cache.aget(VERSION_KEY)
+    if version is not None:
+        catalog = await cache.aget(_catalog_key(version))
+        if catalog is not None and not catalog.is_stale:
+            return catalog
+    return await sync_to_async(get_catalog)()
+
+
+async def aget_item(item_id):
+    return (await aget_catalog()).by_id.get(item_id)
@@ -0,0 +1,98 @@
+"""
+Resized WebP derivatives of menu images.
+
+``MenuItem.image`` keeps the original upload. ``process()`` writes a WebP
+copy at each width in ``STORE_IMAGE_WIDTHS`` (never wider than the original)
+and stores them, with the original's dimensions, on the item; the
+``menu_image`` template tag turns them into ``srcset``. A new upload is
+processed after its save commits (see ``store.signals``), and
+``manage.py build_image_derivatives`` backfills existing items.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import catalog
+from .models import MenuItem
+from .storage import MediaStorage
+
+WIDTHS = tuple(sorted(getattr(settings, 'STORE_IMAGE_WIDTHS', (320, 640, 960, 1280))))
+WEBP_QUALITY = getattr(settings, 'STORE_IMAGE_QUALITY', 80)
+DERIVED_DIR = 'menu_images/derived'
+
+
+def target_widths(width):
+    return sorted({min(target, width) for target in WIDTHS})
+
+
+def needs_processing(item):
+    return (item.image.name or '') != item.image_derivatives.get('source', '')
+
+
+def render(name, storage=default_storage):
+    """
+    Write the derivatives of the image stored as ``name``. Returns the field
+    values for the item: ``image_width``, ``image_height``, ``image_derivatives``.
+    """
+    # Imported here so web workers that never process an upload skip Pillow.
+    from PIL import Image, ImageOps
+
+    with storage.open(name) as handle, Image.open(handle) as original:
+        full_width = original.width
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is much
+        # cheaper than decoding a camera-sized original and shrinking it.
+        original.draft('RGB', (WIDTHS[-1], WIDTHS[-1]))
+        scale = full_width / original.width
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+        width, height = round(image.width * scale), round(image.height * scale)
+
+        stem = MediaStorage.stem(name)
+        derived = {}
+        for target in target_widths(width):
+            size = (target, max(1, round(image.height * target / image.width)))
+            buffer = io.BytesIO()
+            image.resize(size, Image.Resampling.LANCZOS).save(buffer, 'WEBP', quality=WEBP_QUALITY)
+            derived[str(target)] = storage.save(
+                f'{DERIVED_DIR}/{stem}-{target}w.webp', ContentFile(buffer.getvalue())
+            )
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_derivatives': {'source': name, 'webp': derived},
+    }
+
+
+def save(item, fields, storage=default_storage):
+    """
+    Store rendered ``fields`` on ``item`` unless its image was replaced
+    meanwhile, and delete whichever set of derivatives lost.
+    """
+    new = set(fields['image_derivatives'].get('webp', {}).values())
+    old = set(item.image_derivatives.get('webp', {}).values())
+    if MenuItem.objects.filter(pk=item.pk, image=item.image.name or '').update(**fields):
+        garbage = old - new
+        # update() sends no post_save, so bump the catalog here.
+        catalog.invalidate()
+        updated = True
+    else:
+        # The new image's own save will process it.
+        garbage = new
+        updated = False
+    for name in garbage:
+        storage.delete(name)
+    return updated
+
+
+def process(item_id):
+    item = MenuItem.objects.filter(pk=item_id).first()
+    if item is None or not needs_processing(item):
+        return False
+    if item.image:
+        fields = render(item.image.name)
+    else:
+        fields = {'image_width': None, 'image_height': None, 'image_derivatives': {}}
+    return save(item, fields)
@@ -0,0 +1,155 @@
+"""
+Group-commit order intake.
+
+With ``STORE_ORDER_INTAKE`` on, checkout does not write its own order.
+The request thread reads and validates the cart, then ``submit()`` queues
+the order for a single writer thread in the process, which commits up to
+``STORE_ORDER_INTAKE_BATCH_SIZE`` queued orders in one transaction. It
+waits at most ``STORE_ORDER_INTAKE_MAX_WAIT`` seconds after the first of
+them. At lunch-rush peaks this replaces dozens of write transactions (one
+SQLite write lock and one WAL commit each) with a few. Each request waits
+on a future for its ``Order``.
+
+Every order is written inside its own savepoint, so a bad order fails
+alone. An order whose idempotency key was already used resolves to the
+order placed the first time.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from time import monotonic
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+from . import orders
+from .models import CartItem
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    __slots__ = ('order', 'lines', 'cart_items', 'future')
+
+    def __init__(self, order, lines, cart_items):
+        self.order = order
+        self.lines = lines
+        self.cart_items = cart_items
+        self.future = Future()
+
+
+class OrderIntake:
+    def __init__(self, batch_size, max_wait):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.pid = os.getpid()
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='store-order-intake', daemon=True)
+        self._thread.start()
+
+    def submit(self, order, lines, cart_items=()):
+        """
+        Queue ``order`` with its cart ``lines`` (as for
+        ``orders.create_order``). ``cart_items`` are ``CartItem`` ids to
+        delete in the same transaction. Returns a ``Future`` for the order.
+        """
+        job = Job(order, lines, list(cart_items))
+        self._queue.put(job)
+        return job.future
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            try:
+                job = self._queue.get(timeout=max(deadline - monotonic(), 0))
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        try:
+            while (batch := self._next_batch()) is not None:
+                close_old_connections()
+                try:
+                    self._commit(batch)
+                except Exception as exc:
+                    logger.exception("Order intake batch of %d failed", len(batch))
+                    for job in batch:
+                        if not job.future.done():
+                            job.future.set_exception(exc)
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        results = []
+        with transaction.atomic():
+            for job in batch:
+                try:
+                    with transaction.atomic():
+                        results.append((job, orders.create_order(job.order, job.lines)))
+                except IntegrityError as exc:
+                    results.append((job, orders.previous_order(job.order) or exc))
+                except Exception as exc:
+                    results.append((job, exc))
+            cart_items = [
+                pk for job, result in results if not isinstance(result, Exception) for pk in job.cart_items
+            ]
+            if cart_items:
+                CartItem.objects.filter(pk__in=cart_items).delete()
+        # Only answer once the batch is durable.
+        for job, result in results:
+            if isinstance(result, Exception):
+                job.future.set_exception(result)
+            else:
+                job.future.set_result(result)
+
+
+_intake = None
+_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'STORE_ORDER_INTAKE', False)
+
+
+def get_intake():
+    """This process's intake, started on first use (and again after a fork)."""
+    global _intake
+    with _lock:
+        if _intake is None or _intake.pid != os.getpid():
+            _intake = OrderIntake(
+                getattr(settings, 'STORE_ORDER_INTAKE_BATCH_SIZE', 50),
+                getattr(settings, 'STORE_ORDER_INTAKE_MAX_WAIT', 0.005),
+            )
+        return _intake
+
+
+def stop():
+    """Commit what is queued and stop the writer thread."""
+    global _intake
+    with _lock:
+        if _intake is not None and _intake.pid == os.getpid():
+            _intake.stop()
+        _intake = None
+
+
+def place(order, lines, cart_items=()):
+    """Queue ``order`` and wait for the writer to commit it; returns the ``Order``."""
+    if not lines:
+        raise orders.EmptyCartError
+    future = get_intake().submit(order, lines, cart_items)
+    return future.result(timeout=getattr(settings, 'STORE_ORDER_INTAKE_TIMEOUT', 10))
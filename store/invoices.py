@@ -0,0 +1,153 @@
+"""
+GST invoice PDFs.
+
+New orders start with ``invoice_status = 'pending'``, which makes the
+``Order`` table the work queue. ``manage.py run_invoice_worker`` claims
+pending orders, renders their HTML in the parent process and converts it
+to PDF across a process pool, then stores the file under
+``INVOICE_ROOT``. ``download_invoice`` streams the stored file and only
+renders inline when the worker has not got to the order yet. Orders from
+before the worker existed are ``on_demand``: they are rendered on download
+unless ``run_invoice_worker --backfill`` queues them.
+"""
+import logging
+from concurrent.futures import as_completed
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.http import FileResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .models import Order
+from .pricing import order_totals, with_line_totals
+
+logger = logging.getLogger(__name__)
+
+# A claim older than this belongs to a worker that died mid-render.
+STALE_CLAIM = timedelta(minutes=10)
+
+
+class InvoiceError(Exception):
+    pass
+
+
+def invoice_context(order):
+    order_items = order.items.select_related('product')
+    totals = order_totals(order_items)
+    return {
+        'order': order,
+        'order_items': with_line_totals(order_items, 'price'),
+        'subtotal': totals.subtotal,
+        'gst_amount': totals.gst_amount,
+        'grand_total': totals.total,
+    }
+
+
+def render_html(order):
+    return render_to_string('store/invoice.html', invoice_context(order))
+
+
+def html_to_pdf(html):
+    """Convert invoice HTML to PDF bytes. Safe to run in a worker process."""
+    # xhtml2pdf pulls in reportlab, pyHanko, lxml and aiohttp (close to a
+    # second of imports), so only processes that render PDFs pay for it.
+    from xhtml2pdf import pisa
+
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result)
+    if pdf.err:
+        raise InvoiceError(f"xhtml2pdf reported {pdf.err} error(s)")
+    return result.getvalue()
+
+
+def store_pdf(order, pdf):
+    old_name = order.invoice_file.name if order.invoice_file else None
+    order.invoice_file.save(f'invoice_{order.id}.pdf', ContentFile(pdf), save=False)
+    if old_name and old_name != order.invoice_file.name:
+        order.invoice_file.storage.delete(old_name)
+    order.invoice_status = Order.INVOICE_READY
+    order.invoice_updated_at = timezone.now()
+    # update() so a concurrent change to the order (e.g. its status) is kept.
+    Order.objects.filter(id=order.id).update(
+        invoice_file=order.invoice_file.name,
+        invoice_status=order.invoice_status,
+        invoice_updated_at=order.invoice_updated_at,
+    )
+
+
+def render_invoice(order):
+    """Render and store the invoice for ``order`` in this process."""
+    store_pdf(order, html_to_pdf(render_html(order)))
+
+
+def has_stored_invoice(order):
+    return (
+        order.invoice_status == Order.INVOICE_READY
+        and bool(order.invoice_file)
+        and order.invoice_file.storage.exists(order.invoice_file.name)
+    )
+
+
+def _claimable():
+    # Led by an IN on invoice_status so order_invoice_queue_idx is used.
+    return Q(invoice_status__in=[Order.INVOICE_PENDING, Order.INVOICE_RENDERING]) & (
+        Q(invoice_status=Order.INVOICE_PENDING)
+        | Q(invoice_updated_at__lt=timezone.now() - STALE_CLAIM)
+    )
+
+
+def claim_pending(limit):
+    """Claim up to ``limit`` orders for this worker and return them."""
+    candidates = Order.objects.filter(_claimable()).order_by('id').values_list('id', flat=True)[:limit]
+    claimed = []
+    for order_id in candidates:
+        # Conditional update: only one worker can move an order out of the queue.
+        if Order.objects.filter(_claimable(), id=order_id).update(
+            invoice_status=Order.INVOICE_RENDERING, invoice_updated_at=timezone.now()
+        ):
+            claimed.append(order_id)
+    return list(Order.objects.filter(id__in=claimed))
+
+
+def queue_backfill():
+    """Queue every ``on_demand`` order for the worker. Returns how many."""
+    return Order.objects.filter(invoice_status=Order.INVOICE_ON_DEMAND).update(
+        invoice_status=Order.INVOICE_PENDING, invoice_updated_at=timezone.now()
+    )
+
+
+def process_pending(executor, limit):
+    """Render one batch of pending invoices on ``executor``. Returns the batch size."""
+    orders = claim_pending(limit)
+    futures = {executor.submit(html_to_pdf, render_html(order)): order for order in orders}
+    for future in as_completed(futures):
+        order = futures[future]
+        try:
+            store_pdf(order, future.result())
+        except Exception:
+            logger.exception("Rendering invoice for order %s failed", order.id)
+            Order.objects.filter(id=order.id).update(
+                invoice_status=Order.INVOICE_FAILED, invoice_updated_at=timezone.now()
+            )
+    return len(orders)
+
+
+def invoice_response(request, order):
+    last_modified = int(order.invoice_updated_at.timestamp())
+    etag = f'"invoice-{order.id}-{last_modified}"'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(
+            order.invoice_file.open('rb'),
+            content_type='application/pdf',
+            as_attachment=True,
+            filename=f'invoice_{order.id}.pdf',
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
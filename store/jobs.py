@@ -0,0 +1,38 @@
+"""
+Periodic background jobs run inside the web process.
+
+Jobs are started by the first request a process serves (see
+``StoreConfig.ready``), so management commands and migrations never spawn
+them. Each job runs on its own daemon thread and closes its database
+connection after every run.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+_started = set()
+_lock = threading.Lock()
+
+
+def run_periodically(name, interval, func):
+    """Call ``func()`` every ``interval`` seconds on a daemon thread, once per process."""
+    with _lock:
+        if name in _started:
+            return
+        _started.add(name)
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            close_old_connections()
+            try:
+                func()
+            except Exception:
+                logger.exception("Periodic job %s failed", name)
+            finally:
+                connection.close()
+
+    threading.Thread(target=loop, name=f'store-job-{name}', daemon=True).start()
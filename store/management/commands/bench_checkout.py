@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store import intake
+from store.models import Cart, CartItem, Category, MenuItem, Order
+from store.orders import place_order
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent checkout throughput (orders/sec) on a scratch "
+        "SQLite database migrated from the current schema, placing each order "
+        "in its own transaction and through the group-commit intake queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Concurrent checkouts.")
+        parser.add_argument('--orders', type=int, default=10, help="Orders placed per thread.")
+        parser.add_argument('--lines', type=int, default=5, help="Cart lines per order.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Intake orders per transaction.")
+        parser.add_argument('--max-wait', type=float, default=0.005, help="Intake batching window in seconds.")
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("This benchmark only runs against the SQLite profile.")
+        with tempfile.TemporaryDirectory() as tmp:
+            connection.settings_dict['TEST'] = {
+                **connection.settings_dict.get('TEST', {}), 'NAME': os.path.join(tmp, 'bench.sqlite3'),
+            }
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                rates = {}
+                for mode in ('one-by-one', 'group commit'):
+                    rates[mode], errors = self.run(mode, options)
+                    self.stdout.write(
+                        f"{mode:>12}: {options['threads']} threads x {options['orders']} orders, "
+                        f"{rates[mode]:.0f} orders/sec ({errors} errors)"
+                    )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        if rates['one-by-one']:
+            speedup = rates['group commit'] / rates['one-by-one']
+            self.stdout.write(self.style.SUCCESS(f"group commit / one-by-one: {speedup:.1f}x"))
+
+    def setup_carts(self, options):
+        category, _ = Category.objects.get_or_create(slug='bench', defaults={'name': 'Bench'})
+        items = [
+            MenuItem.objects.create(category=category, name=f'Item {i}', description='', price=Decimal('100.00') + i)
+            for i in range(options['lines'])
+        ]
+        carts = []
+        for _ in range(options['threads'] * options['orders']):
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=item, quantity=1) for item in items)
+            carts.append(cart.id)
+        return carts
+
+    def run(self, mode, options):
+        carts = self.setup_carts(options)
+        writer = intake.OrderIntake(options['batch_size'], options['max_wait']) if mode == 'group commit' else None
+        errors = []
+        barrier = threading.Barrier(options['threads'])
+
+        def place(cart_id):
+            order = Order(full_name='Bench', email='bench@example.com', phone='0', address='x')
+            if writer is None:
+                return place_order(order, Cart(id=cart_id))
+            items = list(CartItem.objects.filter(cart_id=cart_id).select_related('product'))
+            return writer.submit(order, items, [item.pk for item in items]).result()
+
+        def checkout(cart_ids):
+            try:
+                barrier.wait()
+                for cart_id in cart_ids:
+                    try:
+                        place(cart_id)
+                    except Exception as exc:
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=checkout, args=(carts[i::options['threads']],))
+            for i in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if writer is not None:
+            writer.stop()
+        return (len(carts) - len(errors)) / elapsed, len(errors)
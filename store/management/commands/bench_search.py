@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Q, When
+
+from store import search
+from store.models import Category, MenuItem
+
+WORDS = (
+    'chicken paneer masala butter garlic naan tandoori biryani dosa idli sambar vada '
+    'spicy crispy mutton fish prawn curry fried rice noodles lemon mint coriander '
+    'roasted grilled creamy tomato onion potato cheese mushroom egg coconut'
+).split()
+SYLLABLES = 'ka lo mi ra tu pe si no va ri da go'.split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare FTS5 menu search with icontains filtering on a generated "
+        "catalog. Rows are created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                for query in self.populate(options['items']):
+                    fts = self.time(lambda: search.search(query), options['repeat'])
+                    icontains = self.time(lambda: self.icontains(query), options['repeat'])
+                    self.stdout.write(
+                        f"{query!r:<22} fts p50 {fts[0]:7.2f} ms p95 {fts[1]:7.2f} ms   "
+                        f"icontains p50 {icontains[0]:7.2f} ms p95 {icontains[1]:7.2f} ms"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count):
+        # A few very common dish words plus a long tail of rarer ones, as on a real menu.
+        rng = random.Random(0)
+        rare = [''.join(rng.choices(SYLLABLES, k=3)) for _ in range(3000)]
+        category = Category.objects.create(name='Bench', slug='bench-search')
+        MenuItem.objects.bulk_create(
+            (
+                MenuItem(
+                    category=category,
+                    name=' '.join(rng.sample(WORDS, 2) + [rng.choice(rare)]).title(),
+                    description=' '.join(rng.choices(WORDS, k=10) + rng.choices(rare, k=15)),
+                    price=100,
+                )
+                for _ in range(count)
+            ),
+            batch_size=1000,
+        )
+        return ['chicken', 'butter naan', rare[5], rare[5][:4], f'{rare[7]} curry', 'zzz']
+
+    def icontains(self, query):
+        # Ranked like the FTS results: name matches first.
+        items = MenuItem.objects.filter(is_active=True)
+        words = query.split()
+        for word in words:
+            items = items.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        name_match = Case(When(name__icontains=words[0], then=0), default=1)
+        return list(items.order_by(name_match, 'id')[:50])
+
+    def time(self, func, repeat):
+        func()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95)]
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SCHEMA = 'CREATE TABLE orders (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)'
+
+
+def default_profile(path, timeout):
+    """SQLite as Django used it before: rollback journal, a connection per request."""
+    def transaction(conn, payload):
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        try:
+            conn.execute('BEGIN')
+            conn.execute('INSERT INTO orders (payload) VALUES (?)', (payload,))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    return None, transaction
+
+
+def tuned_profile(path, timeout):
+    """The settings.DATABASES profile: WAL pragmas, IMMEDIATE, persistent connections."""
+    init_command = settings.DATABASES['default'].get('OPTIONS', {}).get('init_command', '')
+
+    def connect():
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        conn.executescript(init_command)
+        return conn
+
+    def transaction(conn, payload):
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('INSERT INTO orders (payload) VALUES (?)', (payload,))
+        conn.execute('COMMIT')
+    return connect, transaction
+
+
+PROFILES = {'default': default_profile, 'tuned': tuned_profile}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent write throughput on a scratch SQLite file with the "
+        "stock configuration and with the tuned profile from settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help="Transactions per thread.")
+        parser.add_argument('--timeout', type=float, default=20)
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("This benchmark only applies to the SQLite profile.")
+        results = {}
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                with sqlite3.connect(path) as conn:
+                    conn.execute(SCHEMA)
+                results[name] = self.run(path, profile, options)
+            self.stdout.write(
+                f"{name:>8}: {results[name][0]:8.0f} writes/sec "
+                f"({results[name][1]} errors)"
+            )
+        if results['default'][0]:
+            speedup = results['tuned'][0] / results['default'][0]
+            self.stdout.write(self.style.SUCCESS(f"tuned / default: {speedup:.1f}x"))
+
+    def run(self, path, profile, options):
+        connect, transaction = profile(path, options['timeout'])
+        errors = []
+        barrier = threading.Barrier(options['threads'])
+
+        def writer():
+            conn = connect() if connect else None
+            barrier.wait()
+            for i in range(options['writes']):
+                try:
+                    transaction(conn, f'order-{i}')
+                except sqlite3.OperationalError as exc:
+                    errors.append(exc)
+            if conn:
+                conn.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        writes = options['threads'] * options['writes'] - len(errors)
+        return writes / elapsed, len(errors)
@@ -0,0 +1,65 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, like a gunicorn worker booting without preload.
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+from food_ordering.wsgi import application
+booted = time.perf_counter()
+warmup = 0.0
+if sys.argv[1] == 'warm':
+    from store.warmup import warm_up
+    warmup = sum(warm_up().values())
+from django.test import Client
+client = Client()
+ready = time.perf_counter()
+client.get('/')
+first = time.perf_counter()
+client.get('/')
+second = time.perf_counter()
+pdf_loaded = 'xhtml2pdf' in sys.modules
+from xhtml2pdf import pisa
+pdf = time.perf_counter() - second
+print(json.dumps({
+    'boot': booted - started, 'warmup': warmup, 'first_request': first - ready,
+    'second_request': second - first, 'pdf_import': pdf, 'pdf_preloaded': pdf_loaded,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker boot time and first-request latency in fresh "
+        "interpreters, with and without store.warmup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'food_ordering.settings'))
+        for mode in ('cold', 'warm'):
+            samples = [self.probe(mode, env) for _ in range(options['runs'])]
+            median = {key: statistics.median(sample[key] for sample in samples) * 1000
+                      for key in ('boot', 'warmup', 'first_request', 'second_request', 'pdf_import')}
+            self.stdout.write(
+                f"{mode}: boot {median['boot']:6.1f} ms  warm-up {median['warmup']:5.1f} ms  "
+                f"first request {median['first_request']:6.1f} ms  "
+                f"second {median['second_request']:5.1f} ms  "
+                f"(PDF stack {'loaded at boot' if samples[0]['pdf_preloaded'] else 'deferred'}, "
+                f"{median['pdf_import']:.0f} ms on first use)"
+            )
+
+    def probe(self, mode, env):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, mode], env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from store import images
+from store.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Render WebP derivatives for menu images that have none or whose "
+        "image changed since. Images are decoded and encoded in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help="Rebuild every image.")
+
+    def handle(self, *args, **options):
+        items = [
+            item for item in MenuItem.objects.exclude(image='').exclude(image__isnull=True)
+            if options['force'] or images.needs_processing(item)
+        ]
+        done = failed = 0
+        # Pillow releases the GIL while resizing and encoding, so threads
+        # scale. Workers only touch files; rows are saved from this thread.
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(images.render, item.image.name): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    fields = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{item.image.name}: {exc}")
+                    continue
+                if images.save(item, fields):
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Built derivatives for {done} image(s), {failed} failed, {len(items)} considered."
+        ))
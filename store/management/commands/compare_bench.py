@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two route benchmark files written by RouteBudgetTests "
+        "(STORE_BENCH_OUTPUT) and fail when a route got slower or chattier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('candidate')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed relative p95 regression before failing (default 0.25).",
+        )
+
+    def handle(self, *args, **options):
+        baseline = self.load(options['baseline'])
+        candidate = self.load(options['candidate'])
+        regressions = []
+        for route in sorted(baseline.keys() | candidate.keys()):
+            old, new = baseline.get(route), candidate.get(route)
+            if old is None or new is None:
+                self.stdout.write(f"{route:<28} {'added' if old is None else 'removed'}")
+                continue
+            change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+            self.stdout.write(
+                f"{route:<28} p95 {old['p95_ms']:8.2f} -> {new['p95_ms']:8.2f} ms ({change:+.0%})  "
+                f"queries {old['queries']} -> {new['queries']}"
+            )
+            if new['queries'] > old['queries'] or change > options['tolerance']:
+                regressions.append(route)
+        if regressions:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def load(self, path):
+        try:
+            with open(path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
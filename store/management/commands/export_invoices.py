@@ -0,0 +1,110 @@
+import csv
+import os
+import shutil
+import signal
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store import invoices
+from store.management.dates import parse_date
+from store.models import Order
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def pdf_name(order):
+    return f'invoice_{order.id}.pdf'
+
+
+class Command(BaseCommand):
+    help = (
+        "Export GST invoices for orders placed between --start and --end "
+        "(inclusive) as PDFs in a ZIP, plus a CSV summary next to it. "
+        "Re-running with the same --output resumes where an interrupted run stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, required=True)
+        parser.add_argument('--end', type=parse_date, required=True)
+        parser.add_argument('--output', required=True, help="Path of the ZIP file to write.")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=50,
+                            help="Invoices rendered per round; bounds memory use.")
+
+    def handle(self, *args, **options):
+        start = timezone.make_aware(datetime.combine(options['start'], dt_time.min))
+        end = timezone.make_aware(datetime.combine(options['end'] + timedelta(days=1), dt_time.min))
+        orders = Order.objects.filter(created_at__gte=start, created_at__lt=end).order_by('created_at', 'id')
+        output = options['output']
+
+        # SIGTERM closes the archive cleanly (writing its central directory)
+        # so the next run can resume from it.
+        previous_handler = signal.signal(signal.SIGTERM, interrupt)
+
+        exported = 0
+        started = time.perf_counter()
+        try:
+            with zipfile.ZipFile(output, 'a', compression=zipfile.ZIP_DEFLATED) as archive, \
+                    ProcessPoolExecutor(max_workers=options['processes']) as executor:
+                done = set(archive.namelist())
+                if done:
+                    self.stdout.write(f"Resuming: {len(done)} invoice(s) already in {output}")
+                chunk = []
+                for order in orders.iterator(chunk_size=500):
+                    if pdf_name(order) in done:
+                        continue
+                    chunk.append(order)
+                    if len(chunk) >= options['chunk_size']:
+                        exported += self.export_chunk(archive, executor, chunk)
+                        chunk = []
+                        self.report(exported, started)
+                if chunk:
+                    exported += self.export_chunk(archive, executor, chunk)
+        except KeyboardInterrupt:
+            self.report(exported, started)
+            raise CommandError(f"Interrupted; run again with --output {output} to resume")
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        summary = self.write_summary(orders, os.path.splitext(output)[0] + '.csv')
+        self.report(exported, started)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output} and {summary}"))
+
+    def export_chunk(self, archive, executor, orders):
+        to_render = []
+        for order in orders:
+            if invoices.has_stored_invoice(order):
+                with order.invoice_file.open('rb') as source, archive.open(pdf_name(order), 'w') as target:
+                    shutil.copyfileobj(source, target)
+            else:
+                to_render.append(order)
+        pdfs = executor.map(invoices.html_to_pdf, [invoices.render_html(order) for order in to_render])
+        for order, pdf in zip(to_render, pdfs):
+            archive.writestr(pdf_name(order), pdf)
+        return len(orders)
+
+    def write_summary(self, orders, path):
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow([
+                'invoice', 'order_id', 'created_at', 'full_name', 'email',
+                'subtotal', 'gst_amount', 'total_amount', 'status',
+            ])
+            for order in orders.iterator(chunk_size=2000):
+                writer.writerow([
+                    pdf_name(order), order.id, order.created_at.isoformat(), order.full_name, order.email,
+                    order.subtotal, order.gst_amount, order.total_amount, order.status,
+                ])
+        return path
+
+    def report(self, exported, started):
+        elapsed = time.perf_counter() - started
+        rate = exported / elapsed if elapsed else 0
+        self.stdout.write(f"{exported} invoice(s) in {elapsed:.1f}s ({rate:.1f} invoices/sec)")
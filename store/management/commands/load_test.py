@@ -0,0 +1,81 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server with increasing concurrency and report the "
+        "highest level that keeps p95 latency under --slo with no errors. "
+        "Run it once against SERVER_MODE=wsgi and once against SERVER_MODE=asgi "
+        "(same WEB_CONCURRENCY) to compare their capacity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help="e.g. http://127.0.0.1:8000")
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help="Path to request; repeat for a mix (default: /, /cart/).",
+        )
+        parser.add_argument('--levels', default='1,8,32,64,128,256', help="Comma-separated concurrency levels.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per level.")
+        parser.add_argument('--slo', type=float, default=500, help="p95 latency budget in ms.")
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['levels'].split(',')]
+        except ValueError:
+            raise CommandError("--levels must be comma-separated integers.")
+        urls = [options['base_url'].rstrip('/') + path for path in options['paths'] or ['/', '/cart/']]
+
+        capacity = 0
+        for level in levels:
+            latencies, errors, elapsed = self.run(urls, level, options['duration'], options['timeout'])
+            if not latencies:
+                raise CommandError(f"No successful requests at concurrency {level}.")
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000
+            self.stdout.write(
+                f"concurrency {level:4d}: {len(latencies) / elapsed:8.1f} req/s  "
+                f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  errors {errors}"
+            )
+            if errors or p95 > options['slo']:
+                break
+            capacity = level
+        self.stdout.write(self.style.SUCCESS(f"capacity within {options['slo']:.0f} ms p95: {capacity}"))
+
+    def run(self, urls, concurrency, duration, timeout):
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client(offset):
+            i = offset
+            while time.perf_counter() < deadline:
+                url = urls[i % len(urls)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(url, timeout=timeout) as response:
+                        response.read()
+                except (urllib.error.URLError, OSError):
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors[0], time.perf_counter() - started
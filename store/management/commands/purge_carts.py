@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.carts import purge_idle_carts
+
+
+class Command(BaseCommand):
+    help = "Delete carts that have been idle for longer than the TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=float, default=getattr(settings, 'STORE_CART_TTL_DAYS', 30),
+                            help="Delete carts untouched for this many days.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Carts deleted per transaction.")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between chunks to let other writers in.")
+
+    def handle(self, *args, **options):
+        carts, lines, reclaimed = purge_idle_carts(
+            ttl=timedelta(days=options['ttl_days']),
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+        )
+        message = f"Deleted {carts} cart(s) and {lines} cart line(s)"
+        if reclaimed is not None:
+            message += f"; {reclaimed / 1024:.1f} KiB returned to the SQLite freelist"
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import reports
+from store.management.dates import parse_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups from the orders, for every day or "
+        "for --from..--to (inclusive). Use it to backfill after deploying the "
+        "rollup tables or to repair them after editing orders by hand."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=parse_date)
+        parser.add_argument('--to', dest='end', type=parse_date)
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['start'] > options['end']:
+            raise CommandError("--from is after --to")
+        days = reports.rebuild(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups for {days} day(s) with orders."))
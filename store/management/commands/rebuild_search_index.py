@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the menu search index and its triggers and reindex every "
+        "item. Run it after a migration that rebuilt store_menuitem."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The FTS5 search index only exists on SQLite.")
+        search.install(connection)
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
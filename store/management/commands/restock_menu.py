@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from store import catalog
+from store.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Reset the stock of every item with a daily_stock to that amount. "
+        "Run it from cron before opening each day."
+    )
+
+    def handle(self, *args, **options):
+        restocked = MenuItem.objects.filter(daily_stock__isnull=False).update(stock=F('daily_stock'))
+        # update() sends no signals, so move the catalog on by hand.
+        catalog.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Restocked {restocked} item(s)."))
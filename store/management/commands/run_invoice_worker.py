@@ -0,0 +1,41 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store import invoices
+
+
+class Command(BaseCommand):
+    help = "Render pending GST invoice PDFs in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Number of PDF rendering processes.")
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help="Orders claimed per batch.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue and exit instead of polling.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First queue the orders from before the worker existed.")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f"Queued {invoices.queue_backfill()} older order(s)")
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options['processes']) as executor:
+            while True:
+                close_old_connections()
+                count = invoices.process_pending(executor, options['batch_size'])
+                rendered += count
+                if count:
+                    self.stdout.write(f"Rendered {count} invoice(s)")
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f"Done: {rendered} invoice(s) rendered"))
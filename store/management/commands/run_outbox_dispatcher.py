@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store import notifications
+
+
+class Command(BaseCommand):
+    help = "Send queued order notifications from the outbox, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Messages sent per batch (default: STORE_OUTBOX_BATCH_SIZE).")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when nothing is due.")
+        parser.add_argument('--once', action='store_true',
+                            help="Send what is due and exit instead of polling.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            close_old_connections()
+            sent, failed = notifications.dispatch(options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} message(s), {failed} failed")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_sent} sent, {total_failed} failed"))
@@ -0,0 +1,12 @@
+"""Argument parsing shared by the management commands."""
+from datetime import date
+
+from django.core.management.base import CommandError
+
+
+def parse_date(value):
+    """``argparse`` type for ``YYYY-MM-DD`` options."""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
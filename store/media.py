@@ -0,0 +1,140 @@
+"""
+Serving ``MEDIA_ROOT`` from the application process.
+
+WhiteNoise only knows about files present at startup, so uploads are served
+by ``serve()``. It answers conditional requests (ETag / Last-Modified) with
+304, honours a single byte range (and ``If-Range``), and picks the gzipped
+sibling ``MediaStorage`` wrote when the client accepts it. Names carrying a
+content hash are cached as immutable for a year; older files for
+``STORE_MEDIA_MAX_AGE``.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import HASHED_NAME
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+CHUNK_SIZE = 64 * 1024
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    Parse a ``Range`` header into an inclusive ``(start, end)``. Returns
+    None for headers to ignore (malformed, multiple ranges) and raises
+    ``UnsatisfiableRange`` for ranges outside the file.
+    """
+    match = RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = size - 1 if not last else min(int(last), size - 1)
+        if last and int(last) < start:
+            return None
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise UnsatisfiableRange
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise UnsatisfiableRange
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def cache_control(name):
+    if HASHED_NAME.search(name):
+        return IMMUTABLE
+    return f"public, max-age={getattr(settings, 'STORE_MEDIA_MAX_AGE', 3600)}"
+
+
+@require_safe
+def serve(request, path):
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        info = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+
+    filename = os.path.basename(full_path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    has_gzip = os.path.exists(full_path + '.gz')
+    encoding = None
+    if has_gzip and ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')):
+        encoding = 'gzip'
+        full_path += '.gz'
+        info = os.stat(full_path)
+
+    size = info.st_size
+    last_modified = int(info.st_mtime)
+    etag = f'"{info.st_mtime_ns:x}-{size:x}{"-gz" if encoding else ""}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        span = None
+        range_header = request.headers.get('Range')
+        if range_header and not encoding:
+            if_range = request.headers.get('If-Range')
+            if if_range is None or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+                try:
+                    span = byte_range(range_header, size)
+                except UnsatisfiableRange:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{size}'
+                    return response
+
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = size
+        elif span is not None:
+            start, end = span
+            response = StreamingHttpResponse(
+                _read(full_path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            # A plain file object lets the WSGI server use sendfile().
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type, filename=filename)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control(path)
+    if has_gzip:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,90 @@
+"""
+In-process request metrics.
+
+``PerformanceMiddleware`` records, per view, wall time, SQL query count,
+SQL time and template render time into fixed-bucket histograms kept in
+this process. ``metrics_view`` exposes them in the Prometheus text format.
+Each gunicorn worker keeps its own histograms, so scrape every worker or
+sum them in the query.
+"""
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+METRICS = {
+    'store_request_duration_seconds': ('Wall time spent serving the request.', TIME_BUCKETS),
+    'store_sql_duration_seconds': ('Time spent in SQL queries per request.', TIME_BUCKETS),
+    'store_sql_queries': ('SQL queries executed per request.', COUNT_BUCKETS),
+    'store_template_duration_seconds': ('Time spent rendering templates per request.', TIME_BUCKETS),
+}
+
+
+class RequestTimings:
+    __slots__ = ('sql_count', 'sql_time', 'template_time')
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+
+# Timings of the request being served on this thread / task, if any.
+current = ContextVar('store_request_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, metric, view, value):
+        with self._lock:
+            histogram = self._histograms.get((metric, view))
+            if histogram is None:
+                histogram = self._histograms[(metric, view)] = Histogram(METRICS[metric][1])
+            histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        with self._lock:
+            snapshot = {
+                key: (list(histogram.counts), histogram.sum)
+                for key, histogram in self._histograms.items()
+            }
+        lines = []
+        for metric, (help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (name, view), (counts, total) in sorted(snapshot.items()):
+                if name != metric:
+                    continue
+                label = view.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(buckets, counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{metric}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+                lines.append(f'{metric}_sum{{view="{label}"}} {total}')
+                lines.append(f'{metric}_count{{view="{label}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
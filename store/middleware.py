@@ -0,0 +1,114 @@
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+
+def time_query(execute, sql, params, many, context):
+    timings = metrics.current.get()
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.sql_count += 1
+            timings.sql_time += perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # Async views run their queries on executor threads, each with its own
+    # connection, so ``time_query`` sits on every connection (see
+    # StoreConfig.ready) instead of being wrapped around the current one per
+    # request. It only counts queries made while ``metrics.current`` is set.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class PerformanceMiddleware:
+    """
+    Time each request, its SQL and its template rendering. Results go out
+    as a ``Server-Timing`` header and into the histograms in
+    ``store.metrics``. Disable with ``STORE_PERFORMANCE_METRICS = False``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STORE_PERFORMANCE_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = metrics.RequestTimings()
+        token = metrics.current.set(timings)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.record(request, response, timings, perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = metrics.RequestTimings()
+        token = metrics.current.set(timings)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.record(request, response, timings, perf_counter() - started)
+
+    @staticmethod
+    def record(request, response, timings, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.observe('store_request_duration_seconds', view, elapsed)
+        metrics.registry.observe('store_sql_duration_seconds', view, timings.sql_time)
+        metrics.registry.observe('store_sql_queries', view, timings.sql_count)
+        metrics.registry.observe('store_template_duration_seconds', view, timings.template_time)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.sql_time * 1000:.2f};desc="{timings.sql_count} queries"',
+            f'tpl;dur={timings.template_time * 1000:.2f}',
+            f'total;dur={elapsed * 1000:.2f}',
+        ])
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware, usable from async code. WhiteNoise only ships
+    a sync middleware; one sync middleware in the stack makes Django run the
+    whole request on a thread under ASGI, async views included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
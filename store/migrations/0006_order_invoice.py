@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:41
+
+import store.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_file',
+            field=models.FileField(blank=True, null=True, storage=store.storage.InvoiceStorage(), upload_to='%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('rendering', 'Rendering'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    for field in ('user', 'session_key'):
+        duplicates = (
+            Cart.objects.filter(**{f'{field}__isnull': False})
+            .values(field).annotate(carts=Count('id')).filter(carts__gt=1)
+        )
+        for row in duplicates:
+            carts = list(Cart.objects.filter(**{field: row[field]}).order_by('id'))
+            keep, extras = carts[0], carts[1:]
+            for item in CartItem.objects.filter(cart__in=extras):
+                line = CartItem.objects.filter(cart=keep, product_id=item.product_id).first()
+                if line:
+                    line.quantity += item.quantity
+                    line.save()
+                    item.delete()
+                else:
+                    item.cart = keep
+                    item.save()
+            Cart.objects.filter(id__in=[cart.id for cart in extras]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_order_invoice'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='menuitem_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['invoice_status', 'id'], name='order_invoice_queue_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user',), name='unique_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('session_key__isnull', False)), fields=('session_key',), name='unique_cart_per_session'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from store import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_menuitem_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='daily_stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+def leave_existing_invoices_on_demand(apps, schema_editor):
+    # 0006 queued every existing order; the worker would re-render the
+    # whole order history on its first run. Those are rendered on download
+    # instead, or queued with `run_invoice_worker --backfill`.
+    Order = apps.get_model('store', 'Order')
+    Order.objects.filter(invoice_status='pending').update(invoice_status='on_demand')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_order_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='invoice_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('rendering', 'Rendering'), ('ready', 'Ready'), ('failed', 'Failed'), ('on_demand', 'On download')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(leave_existing_invoices_on_demand, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
 
+from .storage import InvoiceStorage
+
 # ---------------- Category & Menu ---------------- #
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -18,18 +21,59 @@ class MenuItem(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     image = models.ImageField(upload_to='menu_images/', null=True, blank=True)
+    # Filled by store.images.process(), not by ImageField's width_field /
+    # height_field, which would open the file whenever a row is loaded
+    # without them.
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
+    # Portions left; None means the item is not stock-tracked. Checkout
+    # takes orders off it with a conditional UPDATE (orders.reserve_stock).
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    # Portions the kitchen prepares each day; `manage.py restock_menu`
+    # resets ``stock`` to it. None leaves ``stock`` alone.
+    daily_stock = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # The catalog loads active items in id order.
+            models.Index(fields=['id'], condition=models.Q(is_active=True), name='menuitem_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def is_sold_out(self):
+        return self.stock is not None and self.stock == 0
+
+
+class CatalogVersion(models.Model):
+    # A single row. store.catalog bumps it on every menu change, and each
+    # process re-reads it, so the change reaches processes with their own cache.
+    version = models.PositiveBigIntegerField(default=0)
+
 
 # ---------------- Cart & CartItem ---------------- #
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_key = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last change to the cart, at hourly resolution (see carts.DatabaseCart).
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # One cart per user / guest session; also indexes both lookups.
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(user__isnull=False), name='unique_cart_per_user'
+            ),
+            models.UniqueConstraint(
+                fields=['session_key'], condition=models.Q(session_key__isnull=False), name='unique_cart_per_session'
+            ),
+        ]
 
     def __str__(self):
         if self.user:
@@ -42,6 +86,11 @@ class CartItem(models.Model):
     product = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
@@ -60,16 +109,57 @@ class Order(models.Model):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     gst_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Kitchen workflow; OrderAdmin's "advance status" action moves orders
+    # one step along it and store.status_feed pushes each step to customers.
+    STATUS_FLOW = ['Pending', 'Preparing', 'Out for delivery', 'Delivered']
     status = models.CharField(max_length=50, default='Pending')
     payment_status = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sent with the checkout form so a retried POST finds the order it
+    # already placed instead of creating a second one.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    # Invoice PDFs are rendered by the invoice worker (store.invoices).
+    # Orders from before the worker existed are only rendered when
+    # downloaded, unless `run_invoice_worker --backfill` queues them.
+    INVOICE_PENDING = 'pending'
+    INVOICE_RENDERING = 'rendering'
+    INVOICE_READY = 'ready'
+    INVOICE_FAILED = 'failed'
+    INVOICE_ON_DEMAND = 'on_demand'
+    INVOICE_STATUS_CHOICES = [
+        (INVOICE_PENDING, 'Pending'),
+        (INVOICE_RENDERING, 'Rendering'),
+        (INVOICE_READY, 'Ready'),
+        (INVOICE_FAILED, 'Failed'),
+        (INVOICE_ON_DEMAND, 'On download'),
+    ]
+    invoice_file = models.FileField(upload_to='%Y/%m/', storage=InvoiceStorage(), null=True, blank=True)
+    invoice_status = models.CharField(max_length=20, choices=INVOICE_STATUS_CHOICES, default=INVOICE_PENDING)
+    invoice_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # my_orders keyset pagination
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            # date-range exports
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # invoice worker queue
+            models.Index(fields=['invoice_status', 'id'], name='order_invoice_queue_idx'),
+            # admin changelist filters, newest (highest id) first
+            models.Index(fields=['status', '-id'], name='order_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id}"
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        # Querysets that annotate ``item_count`` (see views.order_history)
+        # avoid a query per order.
+        if hasattr(self, 'item_count'):
+            return self.item_count
+        return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
 
 
 class OrderItem(models.Model):
@@ -84,4 +174,94 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+# ---------------- Sales rollups ---------------- #
+# Incremented by store.reports inside the order transaction; rebuilt from
+# orders with ``manage.py rebuild_sales_rollups``. Amounts are pre-GST
+# unless named otherwise.
+class DailySales(models.Model):
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gst_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class DailyGstSales(models.Model):
+    day = models.DateField()
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    taxable = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gst_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'gst_rate'], name='unique_daily_gst_rate'),
+        ]
+
 
+class DailyItemSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_daily_item'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_daily_category'),
+        ]
+
+
+# ---------------- Notification outbox ---------------- #
+class OutboxMessage(models.Model):
+    """
+    A notification to send about an order, written in the order's own
+    transaction and delivered later by store.notifications.
+    """
+    ORDER_CONFIRMATION = 'order_confirmation'
+    KITCHEN_TICKET = 'kitchen_ticket'
+    KIND_CHOICES = [
+        (ORDER_CONFIRMATION, 'Order confirmation'),
+        (KITCHEN_TICKET, 'Kitchen ticket'),
+    ]
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not before: the next retry, or the end of a dispatcher's claim.
+    available_at = models.DateTimeField(default=timezone.now)
+    claim = models.UUIDField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dispatcher queue: pending messages that are due.
+            models.Index(fields=['available_at', 'id'], condition=models.Q(status='pending'),
+                         name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for order {self.order_id}"
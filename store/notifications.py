@@ -0,0 +1,121 @@
+"""
+Order notifications through a transactional outbox.
+
+``enqueue()`` runs inside the order-placement transaction and writes one
+``OutboxMessage`` per notification (customer confirmation, plus a kitchen
+ticket when ``STORE_KITCHEN_EMAILS`` is set). A message exists exactly
+when its order committed, and checkout never talks to the mail server.
+
+``dispatch()`` delivers due messages in batches, over one email
+connection per batch. It is run by ``manage.py run_outbox_dispatcher`` or
+in-process every ``STORE_OUTBOX_INTERVAL`` seconds (see ``store.jobs``).
+Dispatchers claim a batch with a conditional UPDATE, so several can run at
+once. A failed send is retried with exponential backoff, up to
+``STORE_OUTBOX_MAX_ATTEMPTS`` attempts. A dispatcher that dies mid-batch
+leaves its claim to expire, so delivery is at-least-once.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is reserved for the dispatcher that claimed it.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+
+
+def enqueue(order):
+    """Write the notifications for a just-saved ``order``; call inside its transaction."""
+    kinds = [OutboxMessage.ORDER_CONFIRMATION]
+    if getattr(settings, 'STORE_KITCHEN_EMAILS', None):
+        kinds.append(OutboxMessage.KITCHEN_TICKET)
+    OutboxMessage.objects.bulk_create(OutboxMessage(order=order, kind=kind) for kind in kinds)
+
+
+def retry_delay(attempts):
+    """Backoff before the next try after ``attempts`` failed ones."""
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def claim(limit):
+    """Claim up to ``limit`` due messages for this dispatcher and return them."""
+    now = timezone.now()
+    due = OutboxMessage.objects.filter(status=OutboxMessage.PENDING, available_at__lte=now)
+    candidates = list(due.order_by('available_at', 'id').values_list('id', flat=True)[:limit])
+    if not candidates:
+        return []
+    token = uuid.uuid4()
+    # Only rows still due are taken, so two dispatchers never share a message.
+    due.filter(id__in=candidates).update(claim=token, available_at=now + CLAIM_TIMEOUT)
+    return list(
+        OutboxMessage.objects.filter(claim=token)
+        .select_related('order')
+        .prefetch_related('order__items__product')
+        .order_by('id')
+    )
+
+
+def build_email(message):
+    order = message.order
+    context = {'order': order, 'order_items': order.items.all()}
+    if message.kind == OutboxMessage.KITCHEN_TICKET:
+        subject, to = f"Kitchen ticket: order #{order.id}", settings.STORE_KITCHEN_EMAILS
+    else:
+        subject, to = f"Your order #{order.id} is confirmed", [order.email]
+    body = render_to_string(f'store/emails/{message.kind}.txt', context)
+    return EmailMessage(subject, body, to=to)
+
+
+def dispatch(limit=None):
+    """Send one batch of due messages. Returns ``(sent, failed)``."""
+    messages = claim(limit or getattr(settings, 'STORE_OUTBOX_BATCH_SIZE', 50))
+    if not messages:
+        return 0, 0
+    sent, failed = [], []
+    try:
+        with get_connection() as connection:
+            for message in messages:
+                try:
+                    connection.send_messages([build_email(message)])
+                except Exception as exc:
+                    failed.append((message, exc))
+                else:
+                    sent.append(message.id)
+    except Exception as exc:
+        # Opening the connection failed: retry everything not yet tried.
+        tried = set(sent) | {message.id for message, _ in failed}
+        failed += [(message, exc) for message in messages if message.id not in tried]
+
+    now = timezone.now()
+    if sent:
+        OutboxMessage.objects.filter(id__in=sent).update(status=OutboxMessage.SENT, sent_at=now, claim=None)
+    max_attempts = getattr(settings, 'STORE_OUTBOX_MAX_ATTEMPTS', 8)
+    for message, exc in failed:
+        attempts = message.attempts + 1
+        logger.warning("Sending %s failed (attempt %d): %s", message, attempts, exc)
+        if attempts >= max_attempts:
+            logger.error("Giving up on %s after %d attempts", message, attempts)
+        OutboxMessage.objects.filter(id=message.id).update(
+            attempts=F('attempts') + 1,
+            status=OutboxMessage.FAILED if attempts >= max_attempts else OutboxMessage.PENDING,
+            available_at=now + retry_delay(attempts),
+            last_error=str(exc)[:1000],
+            claim=None,
+        )
+    return len(sent), len(failed)
+
+
+def dispatch_pending():
+    """Drain every due message; the in-process job's entry point."""
+    while any(dispatch()):
+        pass
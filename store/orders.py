@@ -0,0 +1,137 @@
+"""
+Order placement.
+
+An order, its items and the emptied cart are written in one transaction so
+a failure part-way never leaves an order without items or a paid-for cart
+still full. The same transaction adds the order to the sales rollups
+(``store.reports``) and queues its notifications in the outbox
+(``store.notifications``). The write lock is held for a fixed number of
+statements regardless of how many lines the cart has.
+
+Stock-tracked items (``MenuItem.stock`` not null) are taken off stock by
+one conditional ``UPDATE`` for all lines of the order, which only succeeds
+for rows with enough left. No row is read or locked first, so concurrent
+checkouts never wait on each other for stock; when any line is short the
+order fails with ``OutOfStock`` and its transaction undoes the rest.
+
+An order carrying an ``idempotency_key`` that was already used is not
+placed again: the functions here return the order placed the first time.
+With ``STORE_ORDER_INTAKE`` on, carts hand orders to ``store.intake``
+instead, which writes many orders per transaction.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from . import catalog, notifications, pricing, reports
+from .models import CartItem, MenuItem, Order, OrderItem
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(', '.join(product.name for product in products))
+
+
+def reserve_stock(lines):
+    """
+    Take each line's quantity off its product's stock in a single
+    ``UPDATE ... SET stock = stock - q WHERE stock IS NULL OR stock >= q``.
+    Raises ``OutOfStock`` with the products that are short; the caller's
+    transaction must then roll back the rows that were decremented.
+    """
+    quantities, products = {}, {}
+    for line in lines:
+        quantities[line.product.pk] = quantities.get(line.product.pk, 0) + line.quantity
+        products[line.product.pk] = line.product
+    quote = connection.ops.quote_name
+    table, pk, stock = (quote(name) for name in (MenuItem._meta.db_table, 'id', 'stock'))
+    needed = f"CASE {pk} {' '.join(['WHEN %s THEN %s'] * len(quantities))} END"
+    sql = (
+        f"UPDATE {table} SET {stock} = {stock} - {needed} "
+        f"WHERE {pk} IN ({', '.join(['%s'] * len(quantities))}) "
+        f"AND ({stock} IS NULL OR {stock} >= {needed}) RETURNING {pk}, {stock}"
+    )
+    cases = [value for item in quantities.items() for value in item]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, cases + list(quantities) + cases)
+        remaining = dict(cursor.fetchall())
+    short = [products[pk] for pk in quantities if pk not in remaining]
+    if short:
+        raise OutOfStock(short)
+    if 0 in remaining.values():
+        # Something sold out: move the catalog on so menus show it.
+        transaction.on_commit(catalog.invalidate)
+
+
+def create_order(order, lines):
+    """
+    Save ``order`` (an unsaved ``Order`` with customer details filled in)
+    and one ``OrderItem`` per line. ``lines`` are objects with ``product``
+    and ``quantity``; prices and GST rates are taken from the product.
+    Raises ``OutOfStock`` if stock runs short. Must be called inside a
+    transaction.
+    """
+    if not lines:
+        raise EmptyCartError
+    reserve_stock(lines)
+    totals = pricing.totals_for_lines(
+        (line.product.price, line.quantity, line.product.gst_rate) for line in lines
+    )
+    order.subtotal = totals.subtotal
+    order.gst_amount = totals.gst_amount
+    order.total_amount = totals.total
+    order.save()
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=line.product,
+            quantity=line.quantity,
+            price=line.product.price,
+            gst_rate=line.product.gst_rate,
+        )
+        for line in lines
+    ])
+    reports.record_order(order, lines, totals)
+    notifications.enqueue(order)
+    return order
+
+
+def previous_order(order):
+    """The order already placed with ``order``'s idempotency key, if any."""
+    if not order.idempotency_key:
+        return None
+    return Order.objects.filter(idempotency_key=order.idempotency_key).first()
+
+
+def _once(order, place):
+    try:
+        return place()
+    except IntegrityError:
+        # A retry racing the original request lost on the unique key.
+        existing = previous_order(order)
+        if existing is None:
+            raise
+        return existing
+
+
+def place_order(order, cart):
+    """Create ``order`` from the lines of a database ``Cart`` and empty it."""
+    cart_items = CartItem.objects.filter(cart=cart)
+
+    def place():
+        with transaction.atomic():
+            create_order(order, list(cart_items.select_related('product')))
+            cart_items.delete()
+        return order
+    return _once(order, place)
+
+
+def place_order_from_lines(order, lines):
+    """Create ``order`` from in-memory cart lines (e.g. a session cart)."""
+    def place():
+        with transaction.atomic():
+            return create_order(order, lines)
+    return _once(order, place)
@@ -0,0 +1,68 @@
+"""
+GST pricing shared by the cart, checkout and invoices.
+
+Totals are computed with a single aggregate query grouped by GST rate, so
+the database does the per-line ``price * quantity`` work and Python only
+touches one row per distinct rate.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+TWO_PLACES = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+GstBucket = namedtuple('GstBucket', 'rate taxable gst')
+Totals = namedtuple('Totals', 'subtotal gst_amount total buckets')
+
+
+def line_total(price, quantity='quantity'):
+    return ExpressionWrapper(
+        F(price) * F(quantity),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def with_line_totals(queryset, price):
+    """Annotate each row with ``line_total`` for display."""
+    return queryset.annotate(line_total=line_total(price))
+
+
+def summarise(taxable_by_rate):
+    """Build ``Totals`` from a mapping of GST rate -> taxable amount."""
+    buckets = []
+    subtotal = gst_amount = ZERO
+    for rate, taxable in sorted(taxable_by_rate.items()):
+        taxable = Decimal(taxable).quantize(TWO_PLACES)
+        gst = (taxable * Decimal(rate) / 100).quantize(TWO_PLACES)
+        buckets.append(GstBucket(Decimal(rate), taxable, gst))
+        subtotal += taxable
+        gst_amount += gst
+    return Totals(subtotal, gst_amount, subtotal + gst_amount, buckets)
+
+
+def totals_for_lines(lines):
+    """Single pass over already-loaded ``(price, quantity, gst_rate)`` lines."""
+    taxable_by_rate = {}
+    for price, quantity, gst_rate in lines:
+        taxable_by_rate[gst_rate] = taxable_by_rate.get(gst_rate, ZERO) + price * quantity
+    return summarise(taxable_by_rate)
+
+
+def totals_for(queryset, price, gst_rate):
+    rows = (
+        queryset.order_by()
+        .values_list(gst_rate)
+        .annotate(taxable=Sum(line_total(price)))
+    )
+    return summarise(dict(rows))
+
+
+def cart_totals(cart_items):
+    return totals_for(cart_items, 'product__price', 'product__gst_rate')
+
+
+def order_totals(order_items):
+    # Order lines keep the price and rate they were sold at.
+    return totals_for(order_items, 'price', 'gst_rate')
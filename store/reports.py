@@ -0,0 +1,177 @@
+"""
+Daily sales rollups.
+
+``record_order()`` runs inside the order-placement transaction and adds the
+order to four rollups (day, day x GST rate, day x item, day x category) with
+one ``INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col`` per
+table, so an order costs four statements however many lines it has, and the
+rollups can never disagree with the orders that committed.
+``sales_summary()`` answers date-range questions from the rollups alone:
+its cost grows with the number of days and items, not with order volume.
+
+``rebuild()`` recomputes a date range from ``Order``/``OrderItem`` for
+backfills and repairs, using the same per-order GST rounding as checkout.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import pricing
+from .models import DailyCategorySales, DailyGstSales, DailyItemSales, DailySales, Order, OrderItem
+
+
+def _increment(model, keys, rows):
+    """Upsert ``rows`` (dicts keyed by field name), adding to existing counters."""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    columns = [quote(field.column) for field in fields]
+    key_columns = {quote(model._meta.get_field(name).column) for name in keys}
+    counters = [column for column in columns if column not in key_columns]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        + ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+        + f" ON CONFLICT ({', '.join(sorted(key_columns))}) DO UPDATE SET "
+        + ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in counters)
+    )
+    params = [
+        field.get_db_prep_save(row[field.name], connection)
+        for row in rows for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_order(order, lines, totals):
+    """
+    Add a just-saved order to the rollups. ``lines`` are the objects passed
+    to ``orders.create_order`` and ``totals`` the ``pricing.Totals`` it
+    charged. Must be called inside the order's transaction.
+    """
+    day = timezone.localdate(order.created_at)
+    items = defaultdict(lambda: [0, pricing.ZERO])
+    categories = defaultdict(lambda: [0, pricing.ZERO])
+    for line in lines:
+        amount = line.product.price * line.quantity
+        for bucket in (items[line.product.pk], categories[line.product.category_id]):
+            bucket[0] += line.quantity
+            bucket[1] += amount
+
+    _increment(DailySales, ['day'], [{
+        'day': day,
+        'orders': 1,
+        'quantity': sum(quantity for quantity, _ in items.values()),
+        'subtotal': totals.subtotal,
+        'gst_amount': totals.gst_amount,
+        'total_amount': totals.total,
+    }])
+    _increment(DailyGstSales, ['day', 'gst_rate'], [
+        {'day': day, 'gst_rate': bucket.rate, 'taxable': bucket.taxable, 'gst_amount': bucket.gst}
+        for bucket in totals.buckets
+    ])
+    _increment(DailyItemSales, ['day', 'product'], [
+        {'day': day, 'product': product_id, 'quantity': quantity, 'revenue': revenue}
+        for product_id, (quantity, revenue) in items.items()
+    ])
+    _increment(DailyCategorySales, ['day', 'category'], [
+        {'day': day, 'category': category_id, 'quantity': quantity, 'revenue': revenue}
+        for category_id, (quantity, revenue) in categories.items()
+    ])
+
+
+def _in_range(queryset, field, start, end):
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lte': end})
+    return queryset
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute the rollups for days ``start``..``end`` (inclusive; either may
+    be None for an open range) from the orders. Returns the number of days rebuilt.
+    """
+    orders = _in_range(Order.objects.annotate(day=TruncDate('created_at')), 'day', start, end)
+    lines = _in_range(OrderItem.objects.annotate(day=TruncDate('order__created_at')), 'day', start, end)
+    with transaction.atomic():
+        for model in (DailySales, DailyGstSales, DailyItemSales, DailyCategorySales):
+            _in_range(model.objects.all(), 'day', start, end).delete()
+
+        quantities = dict(lines.values('day').annotate(total=Sum('quantity')).values_list('day', 'total'))
+        days = orders.values('day').annotate(
+            orders_count=Count('id'), subtotal=Sum('subtotal'), gst=Sum('gst_amount'), total=Sum('total_amount'),
+        ).order_by('day')
+        DailySales.objects.bulk_create([
+            DailySales(
+                day=row['day'], orders=row['orders_count'], quantity=quantities.get(row['day'], 0),
+                subtotal=row['subtotal'], gst_amount=row['gst'], total_amount=row['total'],
+            )
+            for row in days
+        ])
+
+        # GST is rounded per order and rate at checkout, so sum it the same way.
+        gst = defaultdict(lambda: [pricing.ZERO, pricing.ZERO])
+        per_order = (
+            lines.values('order', 'day', 'gst_rate')
+            .annotate(taxable=Sum(pricing.line_total('price')))
+            .order_by()
+        )
+        for row in per_order.iterator():
+            bucket = pricing.summarise({row['gst_rate']: row['taxable']}).buckets[0]
+            totals = gst[row['day'], bucket.rate]
+            totals[0] += bucket.taxable
+            totals[1] += bucket.gst
+        DailyGstSales.objects.bulk_create([
+            DailyGstSales(day=day, gst_rate=rate, taxable=taxable, gst_amount=amount)
+            for (day, rate), (taxable, amount) in gst.items()
+        ])
+
+        revenue = Sum(pricing.line_total('price'))
+        DailyItemSales.objects.bulk_create([
+            DailyItemSales(day=row['day'], product_id=row['product'], quantity=row['qty'], revenue=row['revenue'])
+            for row in lines.values('day', 'product').annotate(qty=Sum('quantity'), revenue=revenue).order_by()
+        ])
+        DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(
+                day=row['day'], category_id=row['product__category'], quantity=row['qty'], revenue=row['revenue'],
+            )
+            for row in lines.values('day', 'product__category').annotate(qty=Sum('quantity'), revenue=revenue).order_by()
+        ])
+    return len(days)
+
+
+def sales_summary(start, end, top=10):
+    """Totals, GST by rate, best-selling items and categories for ``start``..``end``."""
+    days = DailySales.objects.filter(day__range=(start, end))
+    totals = days.aggregate(
+        orders=Sum('orders'), quantity=Sum('quantity'), subtotal=Sum('subtotal'),
+        gst_amount=Sum('gst_amount'), total_amount=Sum('total_amount'),
+    )
+    gst = (
+        DailyGstSales.objects.filter(day__range=(start, end))
+        .values('gst_rate').annotate(taxable=Sum('taxable'), gst_amount=Sum('gst_amount'))
+        .order_by('gst_rate')
+    )
+    items = (
+        DailyItemSales.objects.filter(day__range=(start, end))
+        .values('product', 'product__name').annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product')[:top]
+    )
+    categories = (
+        DailyCategorySales.objects.filter(day__range=(start, end))
+        .values('category', 'category__name').annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'category')
+    )
+    return {
+        'totals': totals,
+        'days': list(days.order_by('day').values('day', 'orders', 'subtotal', 'gst_amount', 'total_amount')),
+        'gst': list(gst),
+        'items': list(items),
+        'categories': list(categories),
+    }
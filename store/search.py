@@ -0,0 +1,117 @@
+"""
+Full-text menu search.
+
+On SQLite, ``store_menuitem_fts`` is an FTS5 index over ``MenuItem.name``
+and ``description`` (external content, so the text is not stored twice).
+Triggers on ``store_menuitem`` keep it in sync, including for ``update()``
+and ``bulk_create()``, which send no signals. Matches are ranked with BM25
+(name weighted over description); only the page of matches is then
+loaded by primary key.
+
+Django rebuilds SQLite tables for some schema changes, which drops their
+triggers; ``manage.py rebuild_search_index`` recreates them and reindexes.
+Other databases fall back to ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import MenuItem
+
+FTS_TABLE = 'store_menuitem_fts'
+# Relative BM25 weights of the indexed columns.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='store_menuitem', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON store_menuitem BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON store_menuitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description ON store_menuitem BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+UNINSTALL_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+SEARCH_SQL = f"""
+    SELECT item.id FROM {FTS_TABLE}
+    JOIN store_menuitem item ON item.id = {FTS_TABLE}.rowid
+    JOIN store_category category ON category.id = item.category_id
+    WHERE {FTS_TABLE} MATCH %s AND item.is_active AND (%s IS NULL OR category.slug = %s)
+    ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), item.id
+    LIMIT %s
+"""
+
+TOKEN = re.compile(r'\w+')
+
+
+def _execute(using, statements):
+    if using.vendor == 'sqlite':
+        with using.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def install(using=connection):
+    """Create the index and its triggers if missing, then reindex every item."""
+    _execute(using, INSTALL_SQL)
+
+
+def uninstall(using=connection):
+    _execute(using, UNINSTALL_SQL)
+
+
+def match_expression(query):
+    """
+    FTS5 query matching every word of ``query``, the last one as a prefix so
+    results follow the user's typing. Words are quoted, so FTS5 syntax in
+    the input is never interpreted.
+    """
+    words = TOKEN.findall(query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(query, category=None, limit=50):
+    """Active menu items matching ``query``, best first, optionally within a category slug."""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    if connection.vendor != 'sqlite':
+        return fallback_search(query, category, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, [expression, category, category, limit])
+        ids = [row[0] for row in cursor.fetchall()]
+    items = MenuItem.objects.select_related('category').in_bulk(ids)
+    return [items[item_id] for item_id in ids if item_id in items]
+
+
+def fallback_search(query, category=None, limit=50):
+    items = MenuItem.objects.filter(is_active=True).select_related('category')
+    for word in TOKEN.findall(query):
+        items = items.filter(Q(name__icontains=word) | Q(description__icontains=word))
+    if category:
+        items = items.filter(category__slug=category)
+    return list(items.order_by('name', 'id')[:limit])
@@ -0,0 +1,41 @@
+from functools import partial
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import carts, catalog, images, status_feed
+from .models import Category, MenuItem, Order
+
+
+# ---------------- Catalog invalidation ---------------- #
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    # Bump after commit so no worker can refill the new version with
+    # rows from before the change.
+    transaction.on_commit(catalog.invalidate)
+
+
+# ---------------- Menu images ---------------- #
+@receiver(post_save, sender=MenuItem)
+def process_menu_image(sender, instance, **kwargs):
+    if images.needs_processing(instance):
+        transaction.on_commit(partial(images.process, instance.pk))
+
+
+# ---------------- Order status feed ---------------- #
+@receiver(post_save, sender=Order)
+def publish_order_status(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(partial(status_feed.notifier.publish, instance.pk, instance.status))
+
+
+# ---------------- Guest cart hand-off ---------------- #
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    if request is not None:
+        carts.merge_guest_cart(request, user)
@@ -0,0 +1,128 @@
+"""
+Live order status for customers waiting on ``order_success``.
+
+``order_status_stream`` (Server-Sent Events) and ``order_status`` (long
+poll, for clients without ``EventSource``) wait on ``notifier``. This is
+one ``StatusNotifier`` per process, shared by every open connection, so a
+waiting customer costs a queue and no database work.
+
+The notifier learns about changes in two ways:
+
+* ``publish()`` is called after commit by anything in this process that
+  changes a status (the ``Order`` post_save signal and ``OrderAdmin``'s
+  advance action).
+* While anyone is watching, a single poller reads the status of every
+  watched order in one query each ``STORE_ORDER_STATUS_POLL`` seconds.
+  This picks up changes made by other processes.
+
+Waiting needs the ASGI server (``SERVER_MODE=asgi``). Under WSGI every
+open stream would hold a sync worker, so when ``can_wait()`` is false the
+views answer with the current status straight away and ``order_success``
+polls for it instead.
+"""
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, notifier, order_id):
+        self.notifier = notifier
+        self.order_id = order_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    async def get(self, timeout):
+        """The next status, or ``TimeoutError`` after ``timeout`` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def put(self, status):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, status)
+        except RuntimeError:
+            pass  # The connection's event loop has shut down.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.notifier.unsubscribe(self)
+
+
+class StatusNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # order id -> set of Subscriptions, and the last status seen for it.
+        self._subscriptions = {}
+        self._statuses = {}
+        self._poller = None
+
+    def subscribe(self, order_id, status):
+        """
+        Watch ``order_id``, whose status the caller last saw as ``status``.
+        Must be called from a coroutine; use the result as a context manager.
+        """
+        subscription = Subscription(self, order_id)
+        with self._lock:
+            self._subscriptions.setdefault(order_id, set()).add(subscription)
+            known = self._statuses.setdefault(order_id, status)
+            if self._poller is None or self._poller.done() or self._poller.get_loop().is_closed():
+                self._poller = subscription.loop.create_task(self._poll())
+        if known != status:
+            subscription.put(known)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.order_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.order_id, None)
+                self._statuses.pop(subscription.order_id, None)
+            poller = self._poller if not self._subscriptions else None
+            if poller is not None:
+                self._poller = None
+        if poller is not None and not poller.get_loop().is_closed():
+            poller.get_loop().call_soon_threadsafe(poller.cancel)
+
+    def publish(self, order_id, status):
+        """Tell everyone watching ``order_id`` about ``status``. Safe from any thread."""
+        with self._lock:
+            if order_id not in self._subscriptions or self._statuses[order_id] == status:
+                return
+            self._statuses[order_id] = status
+            subscriptions = list(self._subscriptions[order_id])
+        for subscription in subscriptions:
+            subscription.put(status)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(getattr(settings, 'STORE_ORDER_STATUS_POLL', 2))
+            with self._lock:
+                watched = list(self._subscriptions)
+            if not watched:
+                continue
+            try:
+                async for order_id, status in Order.objects.filter(id__in=watched).values_list('id', 'status'):
+                    self.publish(order_id, status)
+            except Exception:
+                logger.exception("Polling %d order statuses failed", len(watched))
+
+
+notifier = StatusNotifier()
+
+
+def is_final(status):
+    return status == Order.STATUS_FLOW[-1]
+
+
+def can_wait(request):
+    """Whether ``request`` came in over ASGI, where waiting holds no worker."""
+    return isinstance(request, ASGIRequest)
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible
+class InvoiceStorage(FileSystemStorage):
+    """
+    Invoice PDFs live under ``INVOICE_ROOT``, outside ``MEDIA_ROOT``, so
+    they are only reachable through ``download_invoice``.
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.INVOICE_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'INVOICE_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+
+# ``<stem>.<12 hex digits>[_<collision suffix>]<ext>``, as saved by MediaStorage.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(_[a-zA-Z0-9]{7})?(?=\.[^./]+$)')
+
+# Text formats worth a precompressed ``.gz`` sibling; images are already compressed.
+COMPRESSIBLE_TYPES = {'image/svg+xml', 'application/json', 'application/xml', 'text/plain', 'text/csv'}
+
+
+@deconstructible
+class MediaStorage(FileSystemStorage):
+    """
+    ``MEDIA_ROOT`` storage that puts a hash of the content in every saved
+    name (``dosa.3f2a9c1be07d.png``). A name then never refers to different
+    bytes, so ``store.media.serve`` can let browsers cache it as immutable.
+    Compressible files also get a gzipped sibling when that saves space.
+    """
+
+    @staticmethod
+    def stem(name):
+        """The file name without directory, hash or extension."""
+        return os.path.splitext(os.path.basename(HASHED_NAME.sub('', name)))[0]
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        root, ext = os.path.splitext(name)
+        name = super()._save(f'{root}.{digest.hexdigest()[:12]}{ext}', content)
+        if mimetypes.guess_type(name)[0] in COMPRESSIBLE_TYPES:
+            self._precompress(name)
+        return name
+
+    def _precompress(self, name):
+        with open(self.path(name), 'rb') as handle:
+            data = handle.read()
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data) * 0.9:
+            with open(self.path(name) + '.gz', 'wb') as handle:
+                handle.write(compressed)
+
+    def delete(self, name):
+        super().delete(name)
+        if name and os.path.exists(self.path(name) + '.gz'):
+            os.remove(self.path(name) + '.gz')
@@ -0,0 +1,36 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def menu_image(item, sizes='100vw', loading='lazy', **attrs):
+    """
+    ``<img>`` for a menu item, with a ``srcset`` of its WebP derivatives::
+
+        {% menu_image item sizes="(min-width: 768px) 25vw, 100vw" class="card-img-top" %}
+
+    Items whose derivatives are missing or out of date fall back to the
+    original upload.
+    """
+    if not item.image:
+        return ''
+    derivatives = item.image_derivatives
+    webp = derivatives.get('webp') if derivatives.get('source') == item.image.name else None
+    if webp:
+        widths = sorted(webp, key=int)
+        src = default_storage.url(webp[widths[-1]])
+        attrs['srcset'] = ', '.join(f'{default_storage.url(webp[width])} {width}w' for width in widths)
+        attrs['sizes'] = sizes
+    else:
+        src = item.image.url
+    if item.image_width and item.image_height:
+        # Lets the browser reserve the box before the image arrives.
+        attrs['width'], attrs['height'] = item.image_width, item.image_height
+    return format_html(
+        '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+        src, item.name, loading,
+        format_html_join('', ' {}="{}"', sorted(attrs.items())),
+    )
@@ -0,0 +1,34 @@
+from time import perf_counter
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings = metrics.current.get()
+            if timings is not None:
+                timings.template_time += perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The stock Django template backend, with render time added to the
+    current request's metrics. Only top-level renders are timed, so
+    ``{% extends %}`` and ``{% include %}`` are not counted twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
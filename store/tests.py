@@ -1,3 +1,1788 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, Sum
+from unittest import mock, skipUnless
+
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils.module_loading import import_string
+from django.utils import timezone
+
+from PIL import Image
+
+from . import (
+    carts, catalog, exports, images, intake, invoices, metrics, notifications, pricing, search, status_feed, warmup,
+)
+from .pagination import EstimatedCountPaginator
+from .orders import EmptyCartError, OutOfStock, place_order
+from .views import STATUS_REFRESH
+from .models import (
+    Cart, CartItem, Category, DailyCategorySales, DailyGstSales, DailyItemSales, DailySales, MenuItem, Order,
+    OrderItem, OutboxMessage,
+)
+
+
+def sign_in(client, username='alice'):
+    user = User.objects.create_user(username)
+    client.force_login(user)
+    return user
+
+
+def make_menu(count=3, category=None, **kwargs):
+    category = category or Category.objects.create(name='Mains', slug='mains')
+    return [
+        MenuItem.objects.create(
+            category=category,
+            name=f'Item {i}',
+            description='Tasty',
+            price=Decimal('100.00') + i,
+            gst_rate=Decimal('5.00'),
+            **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+# ---------------- Catalog cache ---------------- #
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+
+    def test_warm_cache_serves_home_without_queries(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Item 2')
+
+    def test_warm_cache_serves_menu_detail_without_queries(self):
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('menu_detail', args=[self.items[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_item_falls_back_to_database(self):
+        item = self.items[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.is_active = False
+            item.save()
+        self.assertIsNone(catalog.get_item(item.id))
+        response = self.client.get(reverse('menu_detail', args=[item.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_save_and_delete_bump_version(self):
+        catalog.get_catalog()
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].delete()
+        self.assertGreater(catalog.get_version(), version)
+        self.assertEqual(len(catalog.get_catalog().items), 2)
+
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Drinks', slug='drinks')
+        self.assertGreater(catalog.get_version(), version)
+        self.assertEqual(len(catalog.get_catalog().categories), 2)
+
+    def test_stale_entry_served_while_another_worker_refills(self):
+        stale = catalog.get_catalog()
+        stale.expires_at = 0
+        key = f'store:catalog:{stale.version}'
+        cache.set(key, stale)
+        cache.add(f'{key}:lock', 1)
+        with self.assertNumQueries(0):
+            self.assertIs(catalog.get_catalog().is_stale, True)
+
+
+# ---------------- Pricing ---------------- #
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Mains', slug='mains')
+        self.dosa = MenuItem.objects.create(
+            category=category, name='Dosa', description='', price=Decimal('60.00'), gst_rate=Decimal('5.00'))
+        self.biriyani = MenuItem.objects.create(
+            category=category, name='Biriyani', description='', price=Decimal('250.00'), gst_rate=Decimal('12.00'))
+        self.salmon = MenuItem.objects.create(
+            category=category, name='Salmon', description='', price=Decimal('499.99'), gst_rate=Decimal('12.00'))
+        self.user = User.objects.create_user('alice')
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.dosa, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.biriyani, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.salmon, quantity=1)
+
+    def test_cart_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            totals = pricing.cart_totals(CartItem.objects.filter(cart=self.cart))
+        self.assertEqual(totals.subtotal, Decimal('1179.99'))
+        self.assertEqual(totals.buckets, [
+            pricing.GstBucket(Decimal('5.00'), Decimal('180.00'), Decimal('9.00')),
+            pricing.GstBucket(Decimal('12.00'), Decimal('999.99'), Decimal('120.00')),
+        ])
+        self.assertEqual(totals.gst_amount, Decimal('129.00'))
+        self.assertEqual(totals.total, Decimal('1308.99'))
+
+    def test_order_totals_use_recorded_prices(self):
+        order = Order.objects.create(full_name='A', email='a@example.com', phone='1', address='x')
+        OrderItem.objects.create(order=order, product=self.dosa, quantity=2, price=Decimal('55.00'), gst_rate=Decimal('5.00'))
+        totals = pricing.order_totals(order.items.all())
+        self.assertEqual(totals, pricing.Totals(
+            Decimal('110.00'), Decimal('5.50'), Decimal('115.50'),
+            [pricing.GstBucket(Decimal('5.00'), Decimal('110.00'), Decimal('5.50'))],
+        ))
+        self.assertIn('₹115.50', invoices.render_html(order))
+
+    def test_empty_queryset(self):
+        totals = pricing.cart_totals(CartItem.objects.none())
+        self.assertEqual(totals.total, Decimal('0.00'))
+        self.assertEqual(totals.buckets, [])
+
+    def test_cart_and_checkout_pages_agree(self):
+        self.client.force_login(self.user)
+        cart = self.client.get(reverse('cart'))
+        checkout = self.client.get(reverse('checkout'))
+        self.assertEqual(cart.context['grand_total'], checkout.context['total'])
+        self.assertEqual(checkout.context['gst_amount'], Decimal('129.00'))
+
+
+# ---------------- Order placement ---------------- #
+def new_order():
+    return Order(full_name='Guest', email='guest@example.com', phone='123', address='Street')
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.user = User.objects.create_user('alice')
+        self.cart = Cart.objects.create(user=self.user)
+        for item in self.items:
+            CartItem.objects.create(cart=self.cart, product=item, quantity=2)
+
+    def test_places_order_in_constant_queries(self):
+        # SAVEPOINT/RELEASE, select lines, stock update, insert order, bulk
+        # insert items, four rollup upserts, outbox insert, delete cart lines.
+        with self.assertNumQueries(12):
+            order = place_order(new_order(), self.cart)
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.subtotal, Decimal('606.00'))
+        self.assertEqual(order.total_amount, Decimal('636.30'))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_empty_cart_creates_nothing(self):
+        CartItem.objects.all().delete()
+        with self.assertRaises(EmptyCartError):
+            place_order(new_order(), self.cart)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_rolls_back_whole_order(self):
+        original = OrderItem.objects.bulk_create
+
+        def broken_bulk_create(*args, **kwargs):
+            raise RuntimeError('disk full')
+
+        OrderItem.objects.bulk_create = broken_bulk_create
+        try:
+            with self.assertRaises(RuntimeError):
+                place_order(new_order(), self.cart)
+        finally:
+            OrderItem.objects.bulk_create = original
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 3)
+
+    def test_checkout_view_places_order(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('checkout'), {
+            'full_name': 'Guest', 'email': 'guest@example.com', 'phone': '123', 'address': 'Street',
+        })
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_success', args=[order.id]))
+        self.assertTrue(order.payment_status)
+        self.assertEqual(order.user, self.user)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    # Throughput is measured by `manage.py bench_checkout`; this checks correctness.
+    checkouts = 40
+    short = 5
+
+    def test_simultaneous_checkouts_never_leave_partial_orders_or_oversell(self):
+        items = make_menu(5, stock=self.checkouts)
+        MenuItem.objects.filter(pk=items[0].pk).update(stock=self.checkouts - self.short)
+        carts = []
+        for _ in range(self.checkouts):
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=item, quantity=1) for item in items
+            )
+            carts.append(cart)
+
+        errors = []
+        barrier = threading.Barrier(self.checkouts)
+
+        def checkout(cart):
+            try:
+                barrier.wait()
+                place_order(new_order(), cart)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        placed = self.checkouts - self.short
+        self.assertEqual([type(exc) for exc in errors], [OutOfStock] * self.short)
+        self.assertEqual(Order.objects.count(), placed)
+        self.assertEqual(OrderItem.objects.count(), placed * len(items))
+        self.assertEqual(CartItem.objects.count(), self.short * len(items))
+        stock = dict(MenuItem.objects.values_list('pk', 'stock'))
+        self.assertEqual([stock[item.pk] for item in items], [0] + [self.short] * 4)
+
+
+# ---------------- Idempotent checkout / group-commit intake ---------------- #
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.user = sign_in(self.client)
+        carts.set_quantities(Cart.objects.create(user=self.user), {self.items[0].id: 2})
+
+    def test_checkout_form_carries_a_key(self):
+        response = self.client.get(reverse('checkout'))
+        self.assertRegex(response.context['idempotency_key'], r'^[0-9a-f]{32}$')
+        self.assertContains(response, 'name="idempotency_key"')
+
+    def test_retried_post_returns_the_first_order(self):
+        form = {'full_name': 'A', 'email': 'a@example.com', 'phone': '1', 'address': 'x',
+                'idempotency_key': 'retry-0123456789abcdef'}
+        first = self.client.post(reverse('checkout'), form)
+        retry = self.client.post(reverse('checkout'), form)
+        order = Order.objects.get()
+        self.assertEqual(order.idempotency_key, 'retry-0123456789abcdef')
+        self.assertRedirects(first, reverse('order_success', args=[order.id]))
+        self.assertRedirects(retry, reverse('order_success', args=[order.id]))
+
+    def test_racing_duplicate_returns_existing_order(self):
+        existing = Order.objects.create(full_name='A', email='a@example.com', phone='1', address='x',
+                                        idempotency_key='race-0123456789abcdef')
+        duplicate = new_order()
+        duplicate.idempotency_key = existing.idempotency_key
+        self.assertEqual(place_order(duplicate, Cart.objects.get()), existing)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+@override_settings(STORE_ORDER_INTAKE=True, STORE_ORDER_INTAKE_BATCH_SIZE=20, STORE_ORDER_INTAKE_MAX_WAIT=0.02)
+class OrderIntakeTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu(5)
+        self.addCleanup(intake.stop)
+
+    def test_batch_commits_orders_and_resolves_duplicates(self):
+        writer = intake.get_intake()
+        cart = Cart.objects.create()
+        lines = [CartItem.objects.create(cart=cart, product=item, quantity=1) for item in self.items[:2]]
+        futures = []
+        for key in ('key-a', 'key-b', 'key-a'):
+            order = new_order()
+            order.idempotency_key = key
+            futures.append(writer.submit(order, lines, [line.pk for line in lines]))
+        futures.append(writer.submit(new_order(), []))
+        first, second, retry = [future.result(timeout=5) for future in futures[:3]]
+        with self.assertRaises(EmptyCartError):
+            futures[3].result(timeout=5)
+        self.assertEqual(retry.pk, first.pk)
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 4)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_checkout_view_places_order_through_intake(self):
+        user = sign_in(self.client)
+        carts.set_quantities(Cart.objects.create(user=user), {self.items[0].id: 3})
+        response = self.client.post(reverse('checkout'), {
+            'full_name': 'A', 'email': 'a@example.com', 'phone': '1', 'address': 'x',
+        })
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_success', args=[order.id]))
+        self.assertEqual(order.items.get().quantity, 3)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_concurrent_checkouts_through_intake(self):
+        # Throughput against one transaction per order is measured by `manage.py bench_checkout`.
+        threads, per_thread = 8, 5
+        total = threads * per_thread
+        MenuItem.objects.update(stock=total)
+        cart_ids = []
+        for _ in range(total):
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=item, quantity=1) for item in self.items)
+            cart_ids.append(cart.id)
+        results, errors = [], []
+        barrier = threading.Barrier(threads)
+
+        def checkout(ids):
+            try:
+                barrier.wait()
+                for cart_id in ids:
+                    items = list(CartItem.objects.filter(cart_id=cart_id).select_related('product'))
+                    results.append(intake.place(new_order(), items, [item.pk for item in items]))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=(cart_ids[i::threads],)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        # One distinct, persisted order per request.
+        self.assertEqual(len({order.pk for order in results}), total)
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {order.pk for order in results})
+        self.assertEqual(OrderItem.objects.count(), total * len(self.items))
+        self.assertEqual(set(MenuItem.objects.values_list('stock', flat=True)), {0})
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(DailySales.objects.get().orders, total)
+
+
+# ---------------- Stock ---------------- #
+class StockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.untracked, self.tracked, self.scarce = self.items
+        MenuItem.objects.filter(pk=self.tracked.pk).update(stock=10)
+        MenuItem.objects.filter(pk=self.scarce.pk).update(stock=3, daily_stock=12)
+        self.user = sign_in(self.client)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def stock(self):
+        return dict(MenuItem.objects.values_list('pk', 'stock'))
+
+    def test_order_decrements_tracked_items_in_one_statement(self):
+        carts.set_quantities(self.cart, {self.untracked.id: 5, self.tracked.id: 4, self.scarce.id: 2})
+        with CaptureQueriesContext(connection) as captured:
+            place_order(new_order(), self.cart)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "store_menuitem"') for q in captured), 1)
+        self.assertEqual(self.stock(), {self.untracked.pk: None, self.tracked.pk: 6, self.scarce.pk: 1})
+
+    def test_short_line_fails_the_whole_order(self):
+        carts.set_quantities(self.cart, {self.tracked.id: 4, self.scarce.id: 5})
+        with self.assertRaises(OutOfStock) as raised:
+            place_order(new_order(), self.cart)
+        self.assertEqual([product.pk for product in raised.exception.products], [self.scarce.pk])
+        self.assertEqual(self.stock()[self.tracked.pk], 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_checkout_reports_short_items(self):
+        carts.set_quantities(self.cart, {self.scarce.id: 5})
+        response = self.client.post(reverse('checkout'), {
+            'full_name': 'A', 'email': 'a@example.com', 'phone': '1', 'address': 'x',
+        }, follow=True)
+        self.assertRedirects(response, reverse('cart'))
+        self.assertContains(response, 'not enough left of: Item 2')
+
+    def test_selling_out_shows_on_home_without_queries(self):
+        catalog.get_catalog()
+        carts.set_quantities(self.cart, {self.scarce.id: 3})
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(new_order(), self.cart)
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Sold out', count=1)
+        self.assertRedirects(self.client.get(reverse('add_to_cart', args=[self.scarce.id])), reverse('home'))
+
+    def test_restock_menu_resets_daily_stock(self):
+        MenuItem.objects.filter(pk=self.scarce.pk).update(stock=0)
+        call_command('restock_menu', stdout=io.StringIO())
+        self.assertEqual(self.stock(), {self.untracked.pk: None, self.tracked.pk: 10, self.scarce.pk: 12})
+
+    def test_restock_reaches_processes_with_their_own_cache(self):
+        version = catalog.get_version()
+        call_command('restock_menu', stdout=io.StringIO())
+        # Another worker's cache never saw the bump; it reads the version from the database.
+        cache.clear()
+        self.assertGreater(catalog.get_version(), version)
+
+    def test_admin_stock_is_read_only_and_restocked_by_action(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        response = self.client.get(reverse('admin:store_menuitem_change', args=[self.scarce.pk]))
+        self.assertNotContains(response, 'name="stock"')
+        self.assertNotContains(self.client.get(reverse('admin:store_menuitem_changelist')), 'name="form-0-stock"')
+
+        MenuItem.objects.filter(pk=self.scarce.pk).update(stock=0)
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:store_menuitem_changelist'), {
+                'action': 'restock', '_selected_action': [self.untracked.pk, self.scarce.pk],
+            })
+        self.assertEqual(self.stock(), {self.untracked.pk: None, self.tracked.pk: 10, self.scarce.pk: 12})
+        self.assertGreater(catalog.get_version(), version)
+
+
+# ---------------- Notification outbox ---------------- #
+class UnreachableEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('mail server down')
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.user = sign_in(self.client)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def place(self):
+        carts.set_quantities(self.cart, {self.items[0].id: 2, self.items[1].id: 1})
+        return place_order(new_order(), self.cart)
+
+    def test_checkout_queues_without_sending(self):
+        carts.set_quantities(self.cart, {self.items[0].id: 1})
+        response = self.client.post(reverse('checkout'), {
+            'full_name': 'A', 'email': 'a@example.com', 'phone': '1', 'address': 'x',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.kind, message.status), (OutboxMessage.ORDER_CONFIRMATION, OutboxMessage.PENDING))
+
+    @override_settings(STORE_KITCHEN_EMAILS=['kitchen@example.com'])
+    def test_dispatch_sends_batch_in_constant_queries(self):
+        orders = [self.place() for _ in range(5)]
+        # Claim (select, update, fetch, items, products), mark sent.
+        with self.assertNumQueries(6):
+            self.assertEqual(notifications.dispatch(), (10, 0))
+        self.assertEqual(len(mail.outbox), 10)
+        confirmation = next(email for email in mail.outbox if email.to == ['guest@example.com'])
+        self.assertIn(f'order #{orders[0].id}', confirmation.body)
+        self.assertIn('2 x Item 0', confirmation.body)
+        self.assertEqual(sum(email.to == ['kitchen@example.com'] for email in mail.outbox), 5)
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.SENT).exists())
+        self.assertEqual(notifications.dispatch(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='store.tests.UnreachableEmailBackend', STORE_OUTBOX_MAX_ATTEMPTS=3)
+    def test_failures_back_off_then_give_up(self):
+        self.place()
+        with self.assertLogs('store.notifications', 'WARNING') as logs:
+            self.assertEqual(notifications.dispatch(), (0, 1))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('failed (attempt 1): mail server down', logs.output[0])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 1))
+        self.assertIn('mail server down', message.last_error)
+        self.assertGreater(message.available_at, timezone.now() + notifications.RETRY_BASE / 2)
+        self.assertEqual(notifications.dispatch(), (0, 0))
+
+        with self.assertLogs('store.notifications', 'WARNING') as logs:
+            for attempts in (2, 3):
+                OutboxMessage.objects.update(available_at=timezone.now())
+                notifications.dispatch()
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'WARNING', 'ERROR'])
+        self.assertIn('failed (attempt 3)', logs.output[1])
+        self.assertIn('Giving up on', logs.output[2])
+        self.assertIn('after 3 attempts', logs.output[2])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboxMessage.FAILED, 3))
+        self.assertEqual(notifications.retry_delay(3), notifications.RETRY_BASE * 4)
+
+    def test_rolled_back_order_has_no_notifications(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.place()
+            raise RuntimeError('payment declined')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+
+class OutboxDispatcherCommandTests(TransactionTestCase):
+    # The command recycles its connection between batches, which a
+    # TestCase's wrapping transaction would not survive.
+    def test_sends_due_messages_and_exits(self):
+        cache.clear()
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=make_menu(1)[0], quantity=1)
+        place_order(new_order(), cart)
+        out = io.StringIO()
+        call_command('run_outbox_dispatcher', '--once', stdout=out)
+        self.assertIn('1 sent, 0 failed', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+# ---------------- Cart mutations ---------------- #
+class CartMutationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.user = sign_in(self.client)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def quantity(self, item):
+        line = CartItem.objects.filter(cart=self.cart, product=item).first()
+        return line.quantity if line else 0
+
+    def test_increment_is_a_single_update_once_line_exists(self):
+        item = self.items[0]
+        carts.increment(self.cart, item.id)
+        with self.assertNumQueries(1):
+            carts.increment(self.cart, item.id)
+        self.assertEqual(self.quantity(item), 2)
+
+    def test_decrement_removes_last_unit(self):
+        item = self.items[0]
+        CartItem.objects.create(cart=self.cart, product=item, quantity=2)
+        carts.decrement(self.cart, item.id)
+        self.assertEqual(self.quantity(item), 1)
+        carts.decrement(self.cart, item.id, remove_last=False)
+        self.assertEqual(self.quantity(item), 1)
+        carts.decrement(self.cart, item.id)
+        self.assertEqual(self.quantity(item), 0)
+
+    def test_add_to_cart_view(self):
+        item = self.items[1]
+        catalog.get_catalog()
+        self.client.get(reverse('add_to_cart', args=[item.id]))
+        self.client.get(reverse('add_to_cart', args=[item.id]))
+        self.assertEqual(self.quantity(item), 2)
+        self.assertEqual(self.client.get(reverse('add_to_cart', args=[9999])).status_code, 404)
+
+    def test_cart_item_views_are_scoped_to_the_current_cart(self):
+        other = CartItem.objects.create(cart=Cart.objects.create(), product=self.items[0], quantity=1)
+        response = self.client.post(reverse('increment_cart_item', args=[self.items[0].id]))
+        self.assertEqual(response.status_code, 404)
+        other.refresh_from_db()
+        self.assertEqual(other.quantity, 1)
+
+    def test_increase_without_a_cart_creates_nothing(self):
+        self.cart.delete()
+        response = self.client.post(reverse('increment_cart_item', args=[self.items[0].id]))
+        self.assertEqual(response.status_code, 404)
+        self.client.get(reverse('update_cart', args=[self.items[0].id]), {'action': 'increase'})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_batch_update(self):
+        first, second, third = self.items
+        CartItem.objects.create(cart=self.cart, product=first, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=third, quantity=4)
+        catalog.get_catalog()
+        response = self.client.post(
+            reverse('update_cart_batch'),
+            json.dumps({'items': [
+                {'product_id': first.id, 'quantity': 3},
+                {'product_id': second.id, 'quantity': 2},
+                {'product_id': third.id, 'quantity': 0},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['subtotal'], '502.00')
+        self.assertEqual([self.quantity(item) for item in self.items], [3, 2, 0])
+
+    def test_batch_update_rejects_bad_payloads(self):
+        url = reverse('update_cart_batch')
+        response = self.client.post(url, '{"items": [{"product_id": "x"}]}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            url, json.dumps({'items': [{'product_id': 9999, 'quantity': 1}]}), content_type='application/json')
+        self.assertEqual(response.json()['items'], [9999])
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_batch_update_rejects_out_of_range_quantities(self):
+        url = reverse('update_cart_batch')
+        for quantity in (-1, carts.MAX_QUANTITY + 1, 2 ** 70):
+            response = self.client.post(
+                url, json.dumps({'items': [{'product_id': self.items[0].id, 'quantity': quantity}]}),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400, quantity)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_unique_constraint(self):
+        CartItem.objects.create(cart=self.cart, product=self.items[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.items[0])
+
+
+# ---------------- Guest carts ---------------- #
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        catalog.get_catalog()
+
+    def session_cart(self):
+        return self.client.session.get('cart', {})
+
+    def test_guest_cart_never_touches_cart_tables(self):
+        first, second, _ = self.items
+        self.client.get(reverse('add_to_cart', args=[first.id]))
+        self.client.get(reverse('add_to_cart', args=[first.id]))
+        self.client.get(reverse('add_to_cart', args=[second.id]))
+        self.client.post(reverse('decrement_cart_item', args=[second.id]))
+        self.assertEqual(self.session_cart(), {str(first.id): 2, str(second.id): 1})
+        self.assertFalse(Cart.objects.exists())
+
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], Decimal('301.00'))
+
+        self.client.post(reverse('remove_cart_item', args=[second.id]))
+        self.assertEqual(self.session_cart(), {str(first.id): 2})
+        self.assertEqual(self.client.post(reverse('increment_cart_item', args=[second.id])).status_code, 404)
+
+    def test_guest_checkout_writes_order_directly(self):
+        self.client.get(reverse('add_to_cart', args=[self.items[0].id]))
+        response = self.client.post(reverse('checkout'), {
+            'full_name': 'Guest', 'email': 'guest@example.com', 'phone': '123', 'address': 'Street',
+        })
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_success', args=[order.id]))
+        self.assertEqual(order.total_amount, Decimal('105.00'))
+        self.assertEqual(self.session_cart(), {})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_guest_batch_update(self):
+        first, second, _ = self.items
+        response = self.client.post(
+            reverse('update_cart_batch'),
+            json.dumps({'items': [{'product_id': first.id, 'quantity': 2}, {'product_id': second.id, 'quantity': 1}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['subtotal'], '301.00')
+
+    def test_withdrawn_items_drop_out(self):
+        self.client.get(reverse('add_to_cart', args=[self.items[0].id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].delete()
+        self.assertEqual(self.client.get(reverse('cart')).context['cart_items'], [])
+
+    def test_session_cart_merges_into_user_cart_on_login(self):
+        first, second, _ = self.items
+        user = User.objects.create_user('alice', password='pw')
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=first, quantity=1)
+        self.client.get(reverse('add_to_cart', args=[first.id]))
+        self.client.get(reverse('add_to_cart', args=[second.id]))
+
+        self.client.login(username='alice', password='pw')
+        quantities = dict(CartItem.objects.filter(cart__user=user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {first.id: 2, second.id: 1})
+        self.assertEqual(self.session_cart(), {})
+
+    def test_cart_lines_read_the_catalog_once(self):
+        for item in self.items:
+            self.client.get(reverse('add_to_cart', args=[item.id]))
+        cart = carts.SessionCart(self.client.get(reverse('cart')).wsgi_request)
+        with mock.patch.object(catalog, 'get_catalog', wraps=catalog.get_catalog) as get_catalog:
+            self.assertEqual(len(cart.lines()), 3)
+        self.assertEqual(get_catalog.call_count, 1)
+
+    def test_database_backend_for_guests(self):
+        with self.settings(STORE_GUEST_CART_BACKEND='store.carts.DatabaseCart'):
+            self.client.get(reverse('add_to_cart', args=[self.items[0].id]))
+            cart = Cart.objects.get()
+            self.assertEqual(cart.session_key, self.client.session.session_key)
+            self.assertEqual(self.client.get(reverse('cart')).context['total'], Decimal('100.00'))
+
+    def test_database_backend_guest_cart_merges_on_login(self):
+        first, second, _ = self.items
+        user = User.objects.create_user('alice', password='pw')
+        CartItem.objects.create(cart=Cart.objects.create(user=user), product=first, quantity=1)
+        with self.settings(STORE_GUEST_CART_BACKEND='store.carts.DatabaseCart'):
+            self.client.get(reverse('add_to_cart', args=[first.id]))
+            self.client.get(reverse('add_to_cart', args=[second.id]))
+            self.client.login(username='alice', password='pw')
+        quantities = dict(CartItem.objects.filter(cart__user=user).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {first.id: 2, second.id: 1})
+        # The guest cart is gone rather than orphaned under the old session key.
+        self.assertEqual(list(Cart.objects.values_list('user', flat=True)), [user.id])
+
+
+# ---------------- Invoices ---------------- #
+class InvoiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invoice_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, invoice_root)
+        settings_override = override_settings(INVOICE_ROOT=invoice_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        item = make_menu(1)[0]
+        self.order = Order.objects.create(full_name='A', email='a@example.com', phone='1', address='x')
+        OrderItem.objects.create(order=self.order, product=item, quantity=2, price=item.price, gst_rate=item.gst_rate)
+
+    def test_new_orders_are_queued(self):
+        self.assertEqual(self.order.invoice_status, Order.INVOICE_PENDING)
+
+    def test_worker_renders_pending_invoices(self):
+        # Threads stand in for the process pool; html_to_pdf is the same callable.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(invoices.process_pending(executor, limit=10), 1)
+            self.assertEqual(invoices.process_pending(executor, limit=10), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.invoice_status, Order.INVOICE_READY)
+        self.assertTrue(self.order.invoice_file.read().startswith(b'%PDF'))
+
+    def test_older_orders_wait_for_an_explicit_backfill(self):
+        Order.objects.update(invoice_status=Order.INVOICE_ON_DEMAND)
+        self.assertEqual(invoices.claim_pending(10), [])
+        self.assertEqual(invoices.queue_backfill(), 1)
+        self.assertEqual([order.id for order in invoices.claim_pending(10)], [self.order.id])
+
+    def test_claims_are_exclusive(self):
+        self.assertEqual(len(invoices.claim_pending(10)), 1)
+        self.assertEqual(invoices.claim_pending(10), [])
+
+    def test_download_renders_on_miss_then_serves_stored_file(self):
+        url = reverse('download_invoice', args=[self.order.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class ExportInvoicesCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(INVOICE_ROOT=self.tmp)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        item = make_menu(1)[0]
+        self.orders = []
+        for _ in range(3):
+            order = Order.objects.create(full_name='A', email='a@example.com', phone='1', address='x')
+            OrderItem.objects.create(order=order, product=item, quantity=1, price=item.price, gst_rate=item.gst_rate)
+            self.orders.append(order)
+        # One invoice is already stored and should be copied rather than re-rendered.
+        invoices.render_invoice(self.orders[0])
+
+    def export(self):
+        out = io.StringIO()
+        today = self.orders[0].created_at.date().isoformat()
+        call_command(
+            'export_invoices', '--start', today, '--end', today,
+            '--output', os.path.join(self.tmp, 'export.zip'), '--processes', '1', '--chunk-size', '2',
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_exports_zip_and_summary_and_resumes(self):
+        output = self.export()
+        self.assertIn('invoices/sec', output)
+        with zipfile.ZipFile(os.path.join(self.tmp, 'export.zip')) as archive:
+            names = sorted(archive.namelist())
+            self.assertEqual(names, sorted(f'invoice_{order.id}.pdf' for order in self.orders))
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in names))
+        with open(os.path.join(self.tmp, 'export.csv')) as handle:
+            self.assertEqual(len(handle.readlines()), 4)
+
+        self.assertIn('Resuming: 3 invoice(s)', self.export())
+        with zipfile.ZipFile(os.path.join(self.tmp, 'export.zip')) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+
+# ---------------- Order history ---------------- #
+class MyOrdersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        item = make_menu(1)[0]
+        self.user = sign_in(self.client)
+        other = User.objects.create_user('bob')
+        now = timezone.now()
+        for i in range(45):
+            order = Order.objects.create(user=self.user, full_name='A', email='a@example.com', phone='1', address='x')
+            OrderItem.objects.create(order=order, product=item, quantity=i % 3 + 1, price=item.price, gst_rate=item.gst_rate)
+            # Pairs of orders share a timestamp so the id tie-breaker matters.
+            Order.objects.filter(id=order.id).update(created_at=now - timezone.timedelta(minutes=i // 2))
+        Order.objects.create(user=other, full_name='B', email='b@example.com', phone='1', address='x')
+
+    def test_pages_walk_every_order_once_in_constant_queries(self):
+        seen = []
+        cursor = ''
+        while True:
+            # session, user, one keyset query
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('my_orders'), {'cursor': cursor} if cursor else {})
+            seen.extend(order.id for order in response.context['orders'])
+            cursor = response.context['next_cursor']
+            if not cursor:
+                break
+        expected = list(
+            Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_item_counts_are_annotated(self):
+        response = self.client.get(reverse('my_orders'))
+        first = response.context['orders'][0]
+        self.assertEqual(first.total_items, first.items.aggregate(total=Sum('quantity'))['total'])
+
+    def test_json_variant(self):
+        response = self.client.get(reverse('my_orders_api'), {'limit': 40})
+        data = response.json()
+        self.assertEqual(len(data['orders']), 40)
+        rest = self.client.get(reverse('my_orders_api'), {'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(rest['orders']), 5)
+        self.assertIsNone(rest['next_cursor'])
+        self.assertEqual(sum(o['item_count'] for o in data['orders'] + rest['orders']), 90)
+
+    def test_bad_cursor_and_anonymous(self):
+        self.assertEqual(self.client.get(reverse('my_orders_api'), {'cursor': '!!'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('my_orders'), {'cursor': 'abc'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('my_orders_api')).status_code, 401)
+
+
+# ---------------- Query plans ---------------- #
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite syntax")
+class QueryPlanTests(TestCase):
+    """Every hot query should be answered from an index, not a table scan."""
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = self.plan(queryset)
+        scans = [step for step in plan if step.startswith('SCAN') and 'INDEX' not in step]
+        self.assertEqual(scans, [], plan)
+        if index:
+            self.assertTrue(any(index in step for step in plan), plan)
+
+    def test_catalog_query(self):
+        self.assertUsesIndex(
+            MenuItem.objects.filter(is_active=True).select_related('category').order_by('id'),
+            'menuitem_active_idx',
+        )
+
+    def test_cart_lookups(self):
+        user = User.objects.create_user('alice')
+        self.assertUsesIndex(Cart.objects.filter(user=user), 'unique_cart_per_user')
+        self.assertUsesIndex(Cart.objects.filter(session_key='abc'), 'unique_cart_per_session')
+        self.assertUsesIndex(CartItem.objects.filter(cart_id=1, product_id=2))
+        self.assertUsesIndex(CartItem.objects.filter(cart_id=1).select_related('product'))
+
+    def test_order_history_page(self):
+        from .views import order_history
+        user = User.objects.create_user('alice')
+        Order.objects.create(user=user, full_name='A', email='a@example.com', phone='1', address='x')
+        queryset = order_history(user).order_by('-created_at', '-pk')
+        self.assertUsesIndex(queryset, 'order_user_created_idx')
+        self.assertUsesIndex(
+            queryset.filter(Q(created_at__lt=timezone.now()) | Q(created_at=timezone.now(), pk__lt=5)),
+            'order_user_created_idx',
+        )
+
+    def test_order_queues_and_exports(self):
+        self.assertUsesIndex(
+            Order.objects.filter(created_at__gte=timezone.now()).order_by('created_at', 'id'), 'order_created_idx'
+        )
+        self.assertUsesIndex(
+            Order.objects.filter(invoices._claimable()).order_by('id'), 'order_invoice_queue_idx'
+        )
+
+    def test_admin_filters(self):
+        self.assertUsesIndex(Order.objects.filter(status='Pending').order_by('-pk')[:100], 'order_status_idx')
+
+
+# ---------------- Cart garbage collection ---------------- #
+class PurgeCartsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu(2)
+        old = timezone.now() - timezone.timedelta(days=45)
+        self.idle = []
+        for i in range(5):
+            cart = Cart.objects.create(session_key=f'idle-{i}')
+            for item in self.items:
+                CartItem.objects.create(cart=cart, product=item)
+            self.idle.append(cart)
+        Cart.objects.filter(id__in=[cart.id for cart in self.idle]).update(updated_at=old)
+        self.fresh = Cart.objects.create(session_key='fresh')
+        CartItem.objects.create(cart=self.fresh, product=self.items[0])
+
+    def test_purges_idle_carts_in_chunks(self):
+        carts_deleted, lines, reclaimed = carts.purge_idle_carts(timezone.timedelta(days=30), chunk_size=2)
+        self.assertEqual((carts_deleted, lines), (5, 10))
+        self.assertIsNotNone(reclaimed)
+        self.assertEqual(list(Cart.objects.all()), [self.fresh])
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_command_reports(self):
+        out = io.StringIO()
+        call_command('purge_carts', '--ttl-days', '30', stdout=out)
+        self.assertIn('Deleted 5 cart(s) and 10 cart line(s)', out.getvalue())
+
+    def test_cart_changes_keep_cart_alive(self):
+        user = sign_in(self.client)
+        cart = Cart.objects.create(user=user)
+        Cart.objects.filter(id=cart.id).update(updated_at=timezone.now() - timezone.timedelta(days=45))
+        catalog.get_catalog()
+        self.client.get(reverse('add_to_cart', args=[self.items[0].id]))
+        cart.refresh_from_db()
+        self.assertGreater(cart.updated_at, timezone.now() - timezone.timedelta(minutes=1))
+        # Within the touch interval further changes do not write the cart row.
+        with self.assertNumQueries(4):  # session, user, cart, line update
+            self.client.get(reverse('add_to_cart', args=[self.items[0].id]))
+
+
+# ---------------- Database profile ---------------- #
+@skipUnless(connection.vendor == 'sqlite', "SQLite profile only")
+class SqliteProfileTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('bench_sqlite_writes', '--threads', '2', '--writes', '5', stdout=out)
+        self.assertIn('tuned / default', out.getvalue())
+
+
+# ---------------- Performance metrics ---------------- #
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        make_menu()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('home'))
+        header = response['Server-Timing']
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="3 queries"')
+        self.assertRegex(header, r'tpl;dur=[\d.]+')
+        self.assertRegex(header, r'total;dur=[\d.]+')
+        self.assertIn('desc="0 queries"', self.client.get(reverse('home'))['Server-Timing'])
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE store_request_duration_seconds histogram', body)
+        self.assertIn('store_request_duration_seconds_count{view="home"} 1', body)
+        self.assertIn('store_sql_queries_bucket{view="home",le="3"} 1', body)
+        self.assertIn('store_template_duration_seconds_sum{view="home"}', body)
+
+
+# ---------------- Route budgets ---------------- #
+class RouteBudgetTests(TestCase):
+    """
+    Exercise every route in store/urls.py against a realistic dataset and
+    fail when a view runs more queries than its budget. Per-route p50/p95
+    latencies are written to the JSON file named by ``STORE_BENCH_OUTPUT``
+    (compare two runs with ``manage.py compare_bench``).
+    """
+
+    samples = int(os.environ.get('STORE_BENCH_SAMPLES', 10))
+    menu_size = 300
+    order_count = 3000
+    cart_lines = 50
+
+    # (route, signed in) -> maximum queries. Signed-in requests pay for the
+    # session and user lookups; guest carts live in the session.
+    budgets = {
+        ('home', False): 0,
+        ('menu_detail', False): 0,
+        ('menu_api', False): 0,
+        ('menu_search', False): 2,
+        ('cart', False): 0,
+        ('cart', True): 4,
+        ('add_to_cart', False): 2,
+        ('add_to_cart', True): 4,
+        ('update_cart', True): 4,
+        ('update_cart_batch', True): 5,
+        ('remove_from_cart', True): 4,
+        ('increment_cart_item', True): 4,
+        ('decrement_cart_item', True): 4,
+        ('remove_cart_item', True): 4,
+        ('checkout', True): 5,
+        ('checkout_post', True): 13,
+        ('payment_success', False): 3,
+        ('order_success', False): 1,
+        ('download_invoice', False): 1,
+        ('order_status_stream', False): 1,
+        ('order_status', False): 1,
+        ('my_orders', True): 3,
+        ('my_orders_api', True): 3,
+        ('sales_report', True): 7,
+        ('metrics', True): 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains', slug='mains')
+        MenuItem.objects.bulk_create(
+            MenuItem(
+                category=category, name=f'Dish {i}', description='A realistic description ' * 5,
+                price=Decimal(50 + i % 400), gst_rate=Decimal(('5.00', '12.00', '18.00')[i % 3]),
+            )
+            for i in range(cls.menu_size)
+        )
+        cls.items = list(MenuItem.objects.order_by('id'))
+        cls.user = User.objects.create_user('regular', is_staff=True)
+        Order.objects.bulk_create(
+            Order(user=cls.user, full_name='Regular', email='r@example.com', phone='1', address='x',
+                  subtotal=Decimal('300'), gst_amount=Decimal('15'), total_amount=Decimal('315'))
+            for _ in range(cls.order_count)
+        )
+        orders = list(Order.objects.values_list('id', flat=True))
+        OrderItem.objects.bulk_create(
+            OrderItem(order_id=order_id, product=cls.items[(order_id + k) % cls.menu_size],
+                      quantity=1 + k, price=Decimal('100'), gst_rate=Decimal('5.00'))
+            for order_id in orders for k in range(3)
+        )
+        Order.objects.filter(id=orders[-1]).update(status=Order.STATUS_FLOW[-1])
+        cls.order = Order.objects.get(id=orders[-1])
+
+    def setUp(self):
+        cache.clear()
+        catalog.get_catalog()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(INVOICE_ROOT=self.tmp)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        invoices.render_invoice(self.order)
+
+    @classmethod
+    def tearDownClass(cls):
+        path = os.environ.get('STORE_BENCH_OUTPUT')
+        if path and getattr(cls, 'results', None):
+            with open(path, 'w') as handle:
+                json.dump(cls.results, handle, indent=2, sort_keys=True)
+        super().tearDownClass()
+
+    def fill_cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        carts.set_quantities(cart, {item.id: 2 for item in self.items[:self.cart_lines]})
+
+    def remember_order(self):
+        session = self.client.session
+        session['order_id'] = self.order.id
+        session.save()
+
+    def requests(self):
+        """Yield (budget key, callable making one request, setup before each sample)."""
+        item = self.items[0]
+        get, post = self.client.get, self.client.post
+        batch = json.dumps({'items': [{'product_id': i.id, 'quantity': 3} for i in self.items[:20]]})
+        checkout_form = {'full_name': 'R', 'email': 'r@example.com', 'phone': '1', 'address': 'x'}
+        yield ('home', False), lambda: get(reverse('home')), None
+        yield ('menu_detail', False), lambda: get(reverse('menu_detail', args=[item.id])), None
+        yield ('menu_search', False), lambda: get(reverse('menu_search'), {'q': 'dish 1', 'category': 'mains'}), None
+        yield ('menu_api', False), lambda: get(reverse('menu_api'), HTTP_ACCEPT_ENCODING='gzip'), None
+        yield ('cart', False), lambda: get(reverse('cart')), None
+        yield ('add_to_cart', False), lambda: get(reverse('add_to_cart', args=[item.id])), None
+        yield ('payment_success', False), lambda: get(reverse('payment_success')), self.remember_order
+        yield ('order_success', False), lambda: get(reverse('order_success', args=[self.order.id])), None
+        yield ('download_invoice', False), lambda: get(reverse('download_invoice', args=[self.order.id])), None
+        yield ('order_status_stream', False), lambda: get(reverse('order_status_stream', args=[self.order.id])), None
+        yield ('order_status', False), lambda: get(reverse('order_status', args=[self.order.id])), None
+
+        signed_in = [
+            (('cart', True), lambda: get(reverse('cart')), None),
+            (('add_to_cart', True), lambda: get(reverse('add_to_cart', args=[item.id])), None),
+            (('update_cart', True), lambda: get(reverse('update_cart', args=[item.id]), {'action': 'increase'}), None),
+            (('update_cart_batch', True),
+             lambda: post(reverse('update_cart_batch'), batch, content_type='application/json'), None),
+            (('increment_cart_item', True), lambda: post(reverse('increment_cart_item', args=[item.id])), None),
+            (('decrement_cart_item', True), lambda: post(reverse('decrement_cart_item', args=[item.id])), None),
+            (('remove_from_cart', True), lambda: get(reverse('remove_from_cart', args=[item.id])), self.fill_cart),
+            (('remove_cart_item', True), lambda: post(reverse('remove_cart_item', args=[item.id])), self.fill_cart),
+            (('checkout', True), lambda: get(reverse('checkout')), None),
+            (('checkout_post', True), lambda: post(reverse('checkout'), checkout_form), self.fill_cart),
+            (('my_orders', True), lambda: get(reverse('my_orders')), None),
+            (('my_orders_api', True), lambda: get(reverse('my_orders_api')), None),
+            (('sales_report', True), lambda: get(reverse('sales_report')), None),
+            (('metrics', True), lambda: get(reverse('metrics')), None),
+        ]
+        self.client.force_login(self.user)
+        self.fill_cart()
+        yield from signed_in
+
+    def test_every_route_has_a_budget(self):
+        routes = {name for name in get_resolver('store.urls').reverse_dict if isinstance(name, str)}
+        budgeted = {route.replace('_post', '') for route, _ in self.budgets}
+        self.assertEqual(routes - budgeted, set())
+
+    def test_query_budgets_and_latency(self):
+        results = {}
+        for key, make_request, before_each in self.requests():
+            route, signed_in = key
+            label = f"{route}{'' if signed_in else ' (guest)'}"
+            timings, queries = [], 0
+            for _ in range(self.samples):
+                if before_each:
+                    before_each()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = make_request()
+                    timings.append(time.perf_counter() - started)
+                self.assertLess(response.status_code, 400, label)
+                # Savepoints come from TestCase's wrapping transaction, not the view.
+                statements = [q['sql'] for q in captured if 'SAVEPOINT' not in q['sql']]
+                queries = max(queries, len(statements))
+            with self.subTest(route=label):
+                self.assertLessEqual(queries, self.budgets[key], statements)
+            timings.sort()
+            results[label] = {
+                'queries': queries,
+                'p50_ms': round(statistics.median(timings) * 1000, 3),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+            }
+        type(self).results = results
+
+
+# ---------------- Async views ---------------- #
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.user = User.objects.create_user('alice')
+
+    def test_middleware_stack_is_async_capable(self):
+        # A single sync-only middleware would run every request on a thread under ASGI.
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(path), 'async_capable', False), path)
+
+    async def test_read_views(self):
+        item = self.items[0]
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, item.name)
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+        response = await self.async_client.get(reverse('menu_detail', args=[item.id]))
+        self.assertEqual(response.context['item'], item)
+
+        await MenuItem.objects.filter(id=item.id).aupdate(is_active=False)
+        response = await self.async_client.get(reverse('menu_detail', args=[item.id]))
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(reverse('menu_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_guest_and_user_carts(self):
+        first, second, _ = self.items
+        session = await self.async_client.asession()
+        await session.aset('cart', {str(first.id): 2})
+        await session.asave()
+        self.async_client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        response = await self.async_client.get(reverse('cart'))
+        self.assertEqual(response.context['grand_total'], Decimal('210.00'))
+
+        cart = await Cart.objects.acreate(user=self.user)
+        await CartItem.objects.acreate(cart=cart, product=second, quantity=3)
+        await self.async_client.aforce_login(self.user)
+        # Signing in merged the guest cart into the user's.
+        response = await self.async_client.get(reverse('cart'))
+        self.assertEqual([line.product for line in response.context['cart_items']], [second, first])
+        self.assertEqual(response.context['total'], Decimal('503.00'))
+
+    async def test_order_pages(self):
+        self.assertEqual((await self.async_client.get(reverse('my_orders'))).status_code, 302)
+        order = new_order()
+        order.user = self.user
+        order.total_amount = Decimal('105.00')
+        await order.asave()
+        await OrderItem.objects.acreate(
+            order=order, product=self.items[0], quantity=4, price=Decimal('100'), gst_rate=Decimal('5.00'),
+        )
+        response = await self.async_client.get(reverse('order_success', args=[order.id]))
+        self.assertContains(response, '105.00')
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('my_orders'))
+        self.assertEqual([o.item_count for o in response.context['orders']], [4])
+        response = await self.async_client.get(reverse('my_orders'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+# ---------------- Order status feed ---------------- #
+class OrderStatusFeedTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(full_name='A', email='a@example.com', phone='1', address='x')
+
+    async def next_event(self, events):
+        return json.loads((await asyncio.wait_for(anext(events), 5)).decode().rsplit('data: ', 1)[1])
+
+    async def test_stream_pushes_changes_until_final(self):
+        response = await self.async_client.get(reverse('order_status_stream', args=[self.order.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertEqual(await self.next_event(events), {'status': 'Pending', 'final': False})
+
+        status_feed.notifier.publish(self.order.id, 'Preparing')
+        self.assertEqual(await self.next_event(events), {'status': 'Preparing', 'final': False})
+        status_feed.notifier.publish(self.order.id, 'Delivered')
+        self.assertEqual(await self.next_event(events), {'status': 'Delivered', 'final': True})
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+        self.assertEqual(status_feed.notifier._subscriptions, {})
+
+    @override_settings(STORE_ORDER_STATUS_POLL=0.01)
+    async def test_shared_poller_sees_changes_from_other_processes(self):
+        streams = []
+        for _ in range(3):
+            response = await self.async_client.get(reverse('order_status_stream', args=[self.order.id]))
+            streams.append(aiter(response.streaming_content))
+            await self.next_event(streams[-1])
+        # update() sends no signal, like a write from another worker.
+        await Order.objects.filter(id=self.order.id).aupdate(status='Out for delivery')
+        for events in streams:
+            self.assertEqual((await self.next_event(events))['status'], 'Out for delivery')
+            # The client goes away: the server cancels the pending read.
+            pending = asyncio.ensure_future(anext(events))
+            await asyncio.sleep(0)
+            pending.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+        # Closed connections stop watching, and the poller with them.
+        self.assertEqual(status_feed.notifier._subscriptions, {})
+        self.assertIsNone(status_feed.notifier._poller)
+
+    @override_settings(STORE_ORDER_STATUS_TIMEOUT=5)
+    async def test_long_poll(self):
+        url = reverse('order_status', args=[self.order.id])
+        response = await self.async_client.get(url, {'since': 'Preparing'})
+        self.assertEqual(response.json(), {'status': 'Pending', 'final': False})
+
+        asyncio.get_running_loop().call_later(0.05, status_feed.notifier.publish, self.order.id, 'Preparing')
+        response = await self.async_client.get(url, {'since': 'Pending'})
+        self.assertEqual(response.json(), {'status': 'Preparing', 'final': False})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+        with override_settings(STORE_ORDER_STATUS_TIMEOUT=0.05):
+            response = await self.async_client.get(url, {'since': 'Pending'})
+        self.assertEqual(response.json()['status'], 'Pending')
+
+    @override_settings(STORE_ORDER_STATUS_TIMEOUT=5)
+    def test_wsgi_answers_without_waiting(self):
+        # The sync test client makes a WSGIRequest; holding it would tie up a worker.
+        response = self.client.get(reverse('order_status_stream', args=[self.order.id]))
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content.decode().split('\n')[0], f'retry: {STATUS_REFRESH * 1000}')
+        self.assertIn('"status": "Pending"', response.content.decode())
+        started = time.monotonic()
+        response = self.client.get(reverse('order_status', args=[self.order.id]), {'since': 'Pending'})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.json(), {'status': 'Pending', 'final': False})
+        self.assertEqual(status_feed.notifier._subscriptions, {})
+
+    async def test_success_page_only_streams_under_asgi(self):
+        url = reverse('order_success', args=[self.order.id])
+        response = await self.async_client.get(url)
+        self.assertContains(response, f'Order ID: <strong>{self.order.id}</strong>', html=False)
+        self.assertContains(response, 'new EventSource')
+        self.assertNotContains(response, 'setInterval')
+        response = await sync_to_async(self.client.get)(url)
+        self.assertNotContains(response, 'new EventSource')
+        self.assertContains(response, 'setInterval')
+
+    def test_admin_advances_each_order_one_step(self):
+        preparing = Order.objects.create(full_name='B', email='b@example.com', phone='1', address='x',
+                                         status='Preparing')
+        delivered = Order.objects.create(full_name='C', email='c@example.com', phone='1', address='x',
+                                         status='Delivered')
+        self.client.force_login(User.objects.create_superuser('admin'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:store_order_changelist'), {
+                'action': 'advance_status',
+                '_selected_action': [self.order.id, preparing.id, delivered.id],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Order.objects.order_by('id').values_list('status', flat=True)),
+            ['Preparing', 'Out for delivery', 'Delivered'],
+        )
+
+
+# ---------------- Menu images ---------------- #
+def image_file(size=(1600, 800), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 20)).save(buffer, fmt)
+    return ContentFile(buffer.getvalue())
+
+
+class MenuImageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_override = override_settings(MEDIA_ROOT=self.media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.item = make_menu(1)[0]
+
+    def upload(self, name, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.image.save(name, image_file(**kwargs))
+        self.item.refresh_from_db()
+
+    def test_upload_builds_derivatives(self):
+        version = catalog.get_version()
+        self.upload('dosa.png')
+        self.assertEqual((self.item.image_width, self.item.image_height), (1600, 800))
+        webp = self.item.image_derivatives['webp']
+        self.assertEqual(sorted(webp, key=int), ['320', '640', '960', '1280'])
+        with default_storage.open(webp['640']) as handle, Image.open(handle) as derived:
+            self.assertEqual((derived.format, derived.size), ('WEBP', (640, 320)))
+        self.assertGreater(catalog.get_version(), version)
+
+    def test_small_images_are_not_upscaled(self):
+        self.upload('small.jpg', size=(500, 400), fmt='JPEG')
+        self.assertEqual(sorted(self.item.image_derivatives['webp'], key=int), ['320', '500'])
+
+    def test_replacing_the_image_removes_old_derivatives(self):
+        self.upload('first.png')
+        old = list(self.item.image_derivatives['webp'].values())
+        self.upload('second.png', size=(800, 800))
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertEqual(self.item.image_derivatives['source'], self.item.image.name)
+
+    def test_template_tag(self):
+        template = Template('{% load store_images %}{% menu_image item sizes="50vw" class="card-img-top" %}')
+        self.upload('dosa.png')
+        html = template.render(Context({'item': self.item}))
+        self.assertRegex(html, r'srcset="/media/menu_images/derived/dosa-320w\.[0-9a-f]{12}\.webp 320w, ')
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="1600"', html)
+
+        # Derivatives of a previous image are ignored.
+        self.item.image.name = 'menu_images/other.png'
+        html = template.render(Context({'item': self.item}))
+        self.assertNotIn('srcset', html)
+        self.assertIn('src="/media/menu_images/other.png"', html)
+
+    def test_backfill_command(self):
+        name = default_storage.save('menu_images/legacy.png', image_file())
+        # Rows written without save() never went through the signal.
+        MenuItem.objects.filter(pk=self.item.pk).update(image=name)
+        out = io.StringIO()
+        call_command('build_image_derivatives', '--workers', '2', stdout=out)
+        self.assertIn('Built derivatives for 1 image(s)', out.getvalue())
+        self.item.refresh_from_db()
+        self.assertFalse(images.needs_processing(self.item))
+        self.assertEqual(self.item.image_width, 1600)
+
+
+# ---------------- Media serving ---------------- #
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_override = override_settings(MEDIA_ROOT=self.media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.name = default_storage.save('menu_images/dosa.png', image_file())
+        self.url = default_storage.url(self.name)
+
+    def test_names_carry_a_content_hash(self):
+        self.assertRegex(self.name, r'^menu_images/dosa\.[0-9a-f]{12}\.png$')
+        self.assertNotEqual(default_storage.save('menu_images/dosa.png', image_file((10, 10))), self.name)
+
+    def test_full_and_conditional_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        with default_storage.open(self.name) as handle:
+            self.assertEqual(b''.join(response.streaming_content), handle.read())
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        with default_storage.open(self.name) as handle:
+            data = handle.read()
+        size = len(data)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{size}')
+        self.assertEqual(b''.join(response.streaming_content), data[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), data[-5:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+        # A stale If-Range gets the whole (changed) file instead of a slice.
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed_text(self):
+        name = default_storage.save('menu_images/logo.svg', ContentFile(b'<svg>' + b'<g/>' * 500 + b'</svg>'))
+        url = default_storage.url(name)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        default_storage.delete(name)
+        self.assertFalse(os.path.exists(default_storage.path(name) + '.gz'))
+
+    def test_legacy_names_and_bad_paths(self):
+        with open(os.path.join(self.media, 'menu_images', 'old.png'), 'wb') as handle:
+            handle.write(b'png')
+        response = self.client.get('/media/menu_images/old.png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.client.get('/media/../food_ordering/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/menu_images/').status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+
+# ---------------- Menu API ---------------- #
+class MenuApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.url = reverse('menu_api')
+
+    def test_payload(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['categories'], [{'name': 'Mains', 'slug': 'mains'}])
+        self.assertEqual(data['items'][0], {
+            'id': self.items[0].id, 'name': 'Item 0', 'description': 'Tasty', 'price': '100.00',
+            'gst_rate': '5.00', 'category': 'mains', 'image': None, 'images': {},
+        })
+
+        data = self.client.get(self.url, {'fields': 'price,id'}).json()
+        self.assertEqual(data['items'][1], {'id': self.items[1].id, 'price': '101.00'})
+        response = self.client.get(self.url, {'fields': 'id,secret'})
+        self.assertEqual((response.status_code, response.json()['fields']), (400, ['secret']))
+
+    def test_conditional_get_costs_no_query(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # A different field set is a different representation.
+        response = self.client.get(self.url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        self.items[0].price = Decimal('90')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['items'][0]['price'], '90.00')
+
+    def test_etag_does_not_depend_on_the_workers_catalog_version(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['version'], response['ETag'].strip('"').removeprefix('menu-'))
+        # Another worker's cache seeds its own version number for the same menu.
+        cache.clear()
+        cache.set(catalog.VERSION_KEY, 12345, None)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+
+# ---------------- Search ---------------- #
+@skipUnless(connection.vendor == 'sqlite', "FTS5 search is SQLite only")
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        mains = Category.objects.create(name='Mains', slug='mains')
+        sides = Category.objects.create(name='Sides', slug='sides')
+        self.curry = MenuItem.objects.create(category=mains, name='Chicken Curry', description='Slow cooked', price=200)
+        self.fry = MenuItem.objects.create(category=mains, name='Fish Fry', description='Served with chicken gravy', price=180)
+        self.naan = MenuItem.objects.create(category=sides, name='Butter Naan', description='Tandoor baked', price=40)
+
+    def test_ranking_prefix_and_category(self):
+        self.assertEqual(search.search('chicken'), [self.curry, self.fry])
+        self.assertEqual(search.search('chick'), [self.curry, self.fry])
+        self.assertEqual(search.search('curries'), [self.curry])  # porter stemming
+        self.assertEqual(search.search('chicken', category='sides'), [])
+        self.assertEqual(search.search('baked', category='sides'), [self.naan])
+        self.assertEqual(search.search('chicken fish'), [self.fry])
+
+    def test_index_follows_writes(self):
+        MenuItem.objects.filter(pk=self.naan.pk).update(name='Garlic Naan')
+        self.assertEqual(search.search('garlic'), [self.naan])
+        self.assertEqual(search.search('butter'), [])
+        MenuItem.objects.bulk_create([MenuItem(category=self.naan.category, name='Garlic Rice', description='', price=90)])
+        self.assertEqual(len(search.search('garlic')), 2)
+        self.fry.delete()
+        self.assertEqual(search.search('fish'), [])
+        MenuItem.objects.filter(pk=self.curry.pk).update(is_active=False)
+        self.assertEqual(search.search('chicken'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        for query in ['"', 'chicken OR', 'NEAR(chicken', '*', 'name:fish', '-']:
+            search.search(query)
+        self.assertEqual(search.search('  '), [])
+
+    def test_view_and_rebuild(self):
+        response = self.client.get(reverse('menu_search'), {'q': 'naan'})
+        self.assertEqual(list(response.context['items']), [self.naan])
+        response = self.client.get(reverse('menu_search'), {'category': 'mains'})
+        self.assertEqual(list(response.context['items']), [self.curry, self.fry])
+        self.assertContains(self.client.get(reverse('menu_search'), {'q': 'pizza'}), 'No dishes match')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_update')
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        MenuItem.objects.filter(pk=self.fry.pk).update(name='Fish Tikka')
+        self.assertEqual(search.search('tikka'), [self.fry])
+
+
+# ---------------- Startup ---------------- #
+class StartupTests(TestCase):
+    def test_pdf_and_image_stacks_are_not_imported_at_boot(self):
+        code = (
+            "import sys, django; django.setup(); "
+            "import food_ordering.wsgi, store.views, store.invoices, store.images; "
+            "print(sorted(m for m in ('xhtml2pdf', 'reportlab', 'PIL') if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='food_ordering.settings')
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_gunicorn_runs_the_outbox_in_process(self):
+        code = "import os, runpy; runpy.run_path('gunicorn.conf.py'); print(os.environ['STORE_OUTBOX_INTERVAL'])"
+        env = {k: v for k, v in os.environ.items() if k != 'STORE_OUTBOX_INTERVAL'}
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), '10')
+
+    def test_asgi_does_not_keep_persistent_connections(self):
+        code = (
+            "import food_ordering.{}; from django.db import connection; "
+            "print(connection.settings_dict['CONN_MAX_AGE'])"
+        )
+        env = dict(os.environ, DB_CONN_MAX_AGE='600')
+        env.pop('SERVER_MODE', None)
+        for module, expected in (('wsgi', '600'), ('asgi', '0')):
+            result = subprocess.run(
+                [sys.executable, '-c', code.format(module)], env=env, capture_output=True, text=True, check=True
+            )
+            self.assertEqual(result.stdout.strip(), expected, module)
+
+    def test_warm_up_compiles_store_templates(self):
+        templates = list(warmup.store_templates())
+        self.assertIn('store/home.html', templates)
+        self.assertNotIn('store/invoice.html', templates)
+        self.assertEqual(set(warmup.warm_up()), {'urls', 'templates'})
+
+
+# ---------------- Sales rollups ---------------- #
+def rollup_rows():
+    return {
+        model.__name__: sorted(model.objects.values_list(*[
+            field.attname for field in model._meta.concrete_fields if field.name != 'id'
+        ]))
+        for model in (DailySales, DailyGstSales, DailyItemSales, DailyCategorySales)
+    }
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        drinks = Category.objects.create(name='Drinks', slug='drinks')
+        self.items.append(MenuItem.objects.create(
+            category=drinks, name='Lassi', description='Sweet', price=Decimal('33.33'), gst_rate=Decimal('18.00'),
+        ))
+        self.user = User.objects.create_user('alice', is_staff=True)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def place(self, quantities):
+        carts.set_quantities(self.cart, {item.id: quantity for item, quantity in zip(self.items, quantities)})
+        return place_order(new_order(), self.cart)
+
+    def test_orders_are_added_to_rollups(self):
+        first = self.place([1, 2, 0, 3])
+        second = self.place([0, 1, 0, 1])
+        day = DailySales.objects.get()
+        self.assertEqual(day.day, timezone.localdate(first.created_at))
+        self.assertEqual((day.orders, day.quantity), (2, 8))
+        self.assertEqual(day.total_amount, first.total_amount + second.total_amount)
+        self.assertEqual(day.gst_amount, first.gst_amount + second.gst_amount)
+        self.assertEqual(DailyItemSales.objects.get(product=self.items[1]).quantity, 3)
+        self.assertEqual(
+            dict(DailyCategorySales.objects.values_list('category__slug', 'revenue')),
+            {'mains': Decimal('403.00'), 'drinks': Decimal('133.32')},
+        )
+        self.assertEqual(DailyGstSales.objects.get(gst_rate=Decimal('18.00')).gst_amount, Decimal('24.00'))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place([1, 2, 0, 3])
+        self.place([0, 1, 5, 1])
+        self.place([0, 0, 0, 7])
+        incremental = rollup_rows()
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        self.assertEqual(rollup_rows(), incremental)
+
+        today = timezone.localdate().isoformat()
+        call_command('rebuild_sales_rollups', '--from', today, '--to', today, stdout=io.StringIO())
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_rolled_back_order_leaves_no_rollups(self):
+        carts.set_quantities(self.cart, {self.items[0].id: 2})
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            place_order(new_order(), self.cart)
+            raise RuntimeError('payment declined')
+        self.assertFalse(DailySales.objects.exists())
+        self.assertFalse(DailyItemSales.objects.exists())
+
+    def test_sales_report(self):
+        self.place([1, 2, 0, 3])
+        self.place([0, 0, 0, 1])
+        self.client.force_login(self.user)
+        with self.assertNumQueries(7):  # session, user, five rollup reads
+            report = self.client.get(reverse('sales_report')).json()
+        self.assertEqual(report['totals']['orders'], 2)
+        self.assertEqual(report['items'][0]['product__name'], 'Item 1')
+        self.assertEqual([row['gst_rate'] for row in report['gst']], ['5.00', '18.00'])
+        self.assertEqual(len(report['days']), 1)
+
+        response = self.client.get(reverse('sales_report'), {'start': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(User.objects.create_user('bob'))
+        self.assertEqual(self.client.get(reverse('sales_report')).status_code, 302)
+
+
+# ---------------- Admin ---------------- #
+class OrderAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.items = make_menu()
+        self.admin_user = User.objects.create_superuser('admin')
+        self.client.force_login(self.admin_user)
+        self.add_orders(5)
+
+    def add_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(
+                user=User.objects.create_user(f'customer{Order.objects.count()}'),
+                full_name=f'Customer {i}', email='c@example.com', phone='1', address='x',
+                status=Order.STATUS_FLOW[i % 2], payment_status=bool(i % 2),
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=item, quantity=1, price=item.price, gst_rate=item.gst_rate)
+                for item in self.items
+            )
+
+    def count_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url, data).status_code, 200)
+        return [q['sql'] for q in captured]
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for url in (reverse('admin:store_order_changelist'), reverse('admin:store_orderitem_changelist')):
+            before = len(self.count_queries(url))
+            self.add_orders(20)
+            self.assertEqual(len(self.count_queries(url)), before, url)
+
+    def test_unfiltered_count_is_estimated(self):
+        url = reverse('admin:store_order_changelist')
+        with mock.patch.object(EstimatedCountPaginator, 'exact_count_below', 0):
+            unfiltered = self.count_queries(url)
+            filtered = self.count_queries(url, {'status': 'Pending'})
+        self.assertFalse(any('COUNT(' in sql for sql in unfiltered), unfiltered)
+        self.assertEqual(sum('COUNT(' in sql for sql in filtered), 1, filtered)
+
+    def test_change_form_lists_items_inline(self):
+        order = Order.objects.first()
+        response = self.client.get(reverse('admin:store_order_change', args=[order.id]))
+        for item in self.items:
+            self.assertContains(response, item.name)
+
+    def export(self):
+        return self.client.post(reverse('admin:store_order_changelist') + '?status=Preparing', {
+            'action': 'export_csv', 'select_across': 1, '_selected_action': [Order.objects.first().id],
+        })
+
+    def test_export_streams_filtered_orders_in_chunks(self):
+        self.add_orders(5)
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2):
+            response = self.export()
+            self.assertEqual(response['Content-Type'], 'text/csv')
+            with CaptureQueriesContext(connection) as captured:
+                content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:3], ['order_id', 'created_at', 'user'])
+        preparing = list(Order.objects.filter(status='Preparing').order_by('id').values_list('id', flat=True))
+        self.assertEqual([int(row[0]) for row in rows[1:]], preparing)
+        # One query per chunk, plus the empty one that ends the export.
+        self.assertEqual(len(captured), len(preparing) // 2 + 1)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.admin_user)
+        response = await self.async_client.post(reverse('admin:store_order_changelist'), {
+            'action': 'export_csv', 'select_across': 1, '_selected_action': [0],
+        })
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(content.splitlines()), 1 + await Order.objects.acount())
@@ -3,10 +3,12 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),  # Home page / Menu
+    path('search/', views.menu_search, name='menu_search'),  # Menu search / category filter
     path('menu/<int:item_id>/', views.menu_detail, name='menu_detail'),  # Menu item details
     path('cart/', views.cart_view, name='cart'),  # Add this line
     path('add-to-cart/<int:item_id>/', views.add_to_cart, name='add_to_cart'),
     path('update-cart/<int:item_id>/', views.update_cart, name='update_cart'),  # Ajax update cart
+    path('update-cart/batch/', views.update_cart_batch, name='update_cart_batch'),  # Ajax batch update
     path('remove-from-cart/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),  # Remove item
       path('cart/increment/<int:item_id>/', views.increment_cart_item, name='increment_cart_item'),
     path('cart/decrement/<int:item_id>/', views.decrement_cart_item, name='decrement_cart_item'),
@@ -14,7 +16,14 @@ urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),  # Checkout page
     path('payment-success/', views.payment_success, name='payment_success'),  # Direct success page
     path('order-success/<int:order_id>/', views.order_success, name='order_success'),  # Order success
+    path('orders/<int:order_id>/events/', views.order_status_stream, name='order_status_stream'),  # Status (SSE)
+    path('orders/<int:order_id>/status/', views.order_status, name='order_status'),  # Status (long poll)
     path('download-invoice/<int:order_id>/', views.download_invoice, name='download_invoice'),  # Invoice download
 
     path('my-orders/', views.my_orders, name='my_orders'),  # User order history
+    path('api/my-orders/', views.my_orders_api, name='my_orders_api'),  # Order history (JSON)
+    path('api/menu/', views.menu_api, name='menu_api'),  # Menu for the mobile app (JSON)
+
+    path('reports/sales/', views.sales_report, name='sales_report'),  # Sales rollups (staff only, JSON)
+    path('metrics/', views.metrics_view, name='metrics'),  # Prometheus metrics (staff only)
 ]
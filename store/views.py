@@ -1,178 +1,284 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import uuid
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from decimal import Decimal
-from .models import MenuItem, Cart, CartItem, Order, OrderItem
+from django.views.decorators.http import require_POST
+from .models import MenuItem, Order, OrderItem
 from .forms import CheckoutForm
+from .carts import MAX_QUANTITY, get_cart, aget_cart
+from .orders import EmptyCartError, OutOfStock, previous_order
+from .pagination import keyset_page, akeyset_page
+from . import catalog, invoices, metrics, reports, search, status_feed
 
-# ---------------- Helper: get or create cart ---------------- #
-def get_or_create_cart(request):
-    if request.user.is_authenticated and not request.user.is_anonymous:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return cart
-    # Guest cart via session
-    cart_id = request.session.get('cart_id')
-    if cart_id:
-        cart = Cart.objects.filter(id=cart_id).first()
-        if cart:
-            return cart
-    cart = Cart.objects.create()
-    request.session['cart_id'] = cart.id
-    return cart
+# The read-heavy pages (home, menu_detail, cart_view, order_success,
+# my_orders) are async views: under ASGI a request waiting on the database
+# or the cache does not hold a worker thread. Their templates must not touch
+# the ORM or the session; everything is fetched before render().
 
 # ---------------- Home ---------------- #
-def home(request):
-    items = MenuItem.objects.filter(is_active=True)
-    return render(request, 'store/home.html', {'items': items})
+async def home(request):
+    menu = await catalog.aget_catalog()
+    return render(request, 'store/home.html', {'items': menu.items, 'categories': menu.categories})
+
+# ---------------- Search ---------------- #
+def menu_search(request):
+    query = request.GET.get('q', '').strip()
+    category = request.GET.get('category') or None
+    menu = catalog.get_catalog()
+    if query:
+        items = search.search(query, category)
+    else:
+        items = [item for item in menu.items if category is None or item.category.slug == category]
+    return render(request, 'store/home.html', {
+        'items': items, 'categories': menu.categories, 'query': query, 'category': category,
+    })
 
 # ---------------- Menu Detail ---------------- #
-def menu_detail(request, item_id):
-    item = get_object_or_404(MenuItem, id=item_id)
+async def menu_detail(request, item_id):
+    item = await catalog.aget_item(item_id)
+    if item is None:
+        # Inactive items are not cached but can still be viewed.
+        item = await aget_object_or_404(MenuItem.objects.select_related('category'), id=item_id)
     return render(request, 'store/menu_detail.html', {'item': item})
 
 # ---------------- Cart Views ---------------- #
 def add_to_cart(request, item_id):
-    cart = get_or_create_cart(request)
-    item = get_object_or_404(MenuItem, id=item_id)
-    cart_item, created = CartItem.objects.get_or_create(cart=cart, product=item)
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    item = catalog.get_item(item_id)
+    if item is None:
+        raise Http404("Menu item not available")
+    if item.is_sold_out:
+        messages.warning(request, f"{item.name} is sold out.")
+        return redirect('home')
+    get_cart(request).add(item_id)
     return redirect('cart')
 
-def cart_view(request):
-    cart = get_or_create_cart(request)
-    cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    gst_rate = Decimal('0.18')
-    gst_amount = total * gst_rate
-    grand_total = total + gst_amount
+async def cart_view(request):
+    cart_items, totals = await (await aget_cart(request)).acontents()
 
     context = {
         'cart_items': cart_items,
-        'total': total,
-        'gst_amount': gst_amount,
-        'grand_total': grand_total
+        'total': totals.subtotal,
+        'gst_amount': totals.gst_amount,
+        'grand_total': totals.total
     }
     return render(request, 'store/cart.html', context)
 
 def update_cart(request, item_id):
-    cart = get_or_create_cart(request)
-    cart_item = CartItem.objects.filter(cart=cart, product_id=item_id).first()
-    if cart_item:
-        action = request.GET.get('action')
-        if action == 'increase':
-            cart_item.quantity += 1
-            cart_item.save()
-        elif action == 'decrease':
-            cart_item.quantity -= 1
-            if cart_item.quantity <= 0:
-                cart_item.delete()
-            else:
-                cart_item.save()
-        elif action == 'remove':
-            cart_item.delete()
+    cart = get_cart(request)
+    action = request.GET.get('action')
+    if action == 'increase':
+        # Only lines already in the cart can be increased here.
+        cart.add(item_id, create=False)
+    elif action == 'decrease':
+        cart.decrement(item_id)
+    elif action == 'remove':
+        cart.remove(item_id)
     return JsonResponse({"success": True})
 
+@require_POST
+def update_cart_batch(request):
+    """
+    Apply several quantity changes in one request, e.g.
+    ``{"items": [{"product_id": 3, "quantity": 2}, {"product_id": 5, "quantity": 0}]}``.
+    Quantities are absolute, from 0 to ``MAX_QUANTITY``; zero removes the line.
+    """
+    try:
+        payload = json.loads(request.body)
+        quantities = {int(row['product_id']): int(row['quantity']) for row in payload['items']}
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"success": False, "error": "Invalid payload"}, status=400)
+    if any(not 0 <= quantity <= MAX_QUANTITY for quantity in quantities.values()):
+        return JsonResponse(
+            {"success": False, "error": f"Quantities must be between 0 and {MAX_QUANTITY}"}, status=400
+        )
+
+    menu = catalog.get_catalog().by_id
+    unknown = [
+        product_id for product_id, quantity in quantities.items()
+        if quantity > 0 and product_id not in menu
+    ]
+    if unknown:
+        return JsonResponse({"success": False, "error": "Unknown menu items", "items": unknown}, status=400)
+
+    cart = get_cart(request)
+    cart.set_quantities(quantities)
+    totals = cart.totals()
+    return JsonResponse({
+        "success": True,
+        "subtotal": str(totals.subtotal),
+        "gst_amount": str(totals.gst_amount),
+        "total": str(totals.total),
+    })
+
 def remove_from_cart(request, item_id):
-    cart = get_or_create_cart(request)
-    cart_item = get_object_or_404(CartItem, cart=cart, product_id=item_id)
-    cart_item.delete()
+    if not get_cart(request).remove(item_id):
+        raise Http404("Item not in cart")
     return redirect('cart')
 
 def increment_cart_item(request, item_id):
-    item = get_object_or_404(CartItem, id=item_id)
-    item.quantity += 1
-    item.save()
+    if not get_cart(request).add(item_id, create=False):
+        raise Http404("Item not in cart")
     return redirect('cart')
 
 def decrement_cart_item(request, item_id):
-    item = get_object_or_404(CartItem, id=item_id)
-    if item.quantity > 1:
-        item.quantity -= 1
-        item.save()
+    get_cart(request).decrement(item_id, remove_last=False)
     return redirect('cart')
 
 def remove_cart_item(request, item_id):
-    item = get_object_or_404(CartItem, id=item_id)
-    item.delete()
+    if not get_cart(request).remove(item_id):
+        raise Http404("Item not in cart")
     return redirect('cart')
 
 # ---------------- Checkout ---------------- #
-def checkout(request):
-    cart = get_or_create_cart(request)
-    cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-    if not cart_items.exists():
-        messages.warning(request, "Your cart is empty!")
-        return redirect('home')
-
-    subtotal = sum(item.product.price * item.quantity for item in cart_items)
-    gst_amount = sum((item.product.price * item.quantity * item.product.gst_rate / 100) for item in cart_items)
-    total_amount = subtotal + gst_amount
+IDEMPOTENCY_KEY = re.compile(r'[A-Za-z0-9-]{16,64}')
 
+def checkout(request):
+    cart = get_cart(request)
+    idempotency_key = request.POST.get('idempotency_key', '')
+    if not IDEMPOTENCY_KEY.fullmatch(idempotency_key):
+        idempotency_key = uuid.uuid4().hex
     if request.method == 'POST':
         form = CheckoutForm(request.POST)
         if form.is_valid():
             order = form.save(commit=False)
+            order.idempotency_key = idempotency_key
             if request.user.is_authenticated:
                 order.user = request.user
-            order.subtotal = subtotal
-            order.gst_amount = gst_amount
-            order.total_amount = total_amount
             order.payment_status = True
-            order.save()
-
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.price,
-                    gst_rate=item.product.gst_rate
-                )
-
-            cart_items.delete()
+            try:
+                order = cart.place_order(order)
+            except OutOfStock as exc:
+                messages.error(request, f"Sorry, not enough left of: {exc}. Please update your cart.")
+                return redirect('cart')
+            except EmptyCartError:
+                # A retried POST finds the cart its first attempt emptied.
+                previous = previous_order(order)
+                if previous is not None:
+                    return redirect('order_success', order_id=previous.id)
+                messages.warning(request, "Your cart is empty!")
+                return redirect('home')
             return redirect('order_success', order_id=order.id)
     else:
         form = CheckoutForm()
 
+    cart_items, totals = cart.contents()
+    if not cart_items:
+        messages.warning(request, "Your cart is empty!")
+        return redirect('home')
+
     context = {
         'form': form,
+        'idempotency_key': idempotency_key,
         'cart_items': cart_items,
-        'subtotal': subtotal,
-        'gst_amount': gst_amount,
-        'total': total_amount
+        'subtotal': totals.subtotal,
+        'gst_amount': totals.gst_amount,
+        'total': totals.total
     }
     return render(request, 'store/checkout.html', context)
 
 # ---------------- Order Success ---------------- #
-def order_success(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
-    return render(request, 'store/order_success.html', {'order': order})
+async def order_success(request, order_id):
+    order = await aget_object_or_404(Order, id=order_id)
+    return render(request, 'store/order_success.html', {
+        'order': order,
+        'live_status': status_feed.can_wait(request),
+        'status_refresh': STATUS_REFRESH,
+    })
 
-# ---------------- Download Invoice ---------------- #
-def download_invoice(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
+# ---------------- Order status feed ---------------- #
+# Seconds between SSE comments that keep idle proxies from closing the stream.
+STATUS_KEEPALIVE = 15
+# Seconds between status checks when the server cannot wait (WSGI).
+STATUS_REFRESH = 30
 
-    # Compute subtotal dynamically
-    items_with_subtotal = []
-    for item in order_items:
-        items_with_subtotal.append({
-            'item': item,
-            'subtotal': item.price * item.quantity
-        })
+def status_payload(status):
+    return {'status': status, 'final': status_feed.is_final(status)}
 
-    total = sum(i['subtotal'] for i in items_with_subtotal)
+def status_event(status):
+    return f"event: status\ndata: {json.dumps(status_payload(status))}\n\n"
 
-    context = {
-        'order': order,
-        'order_items': items_with_subtotal,
-        'total': total
-    }
+async def order_status_stream(request, order_id):
+    """
+    Server-Sent Events: the order's status now, then every change, ending
+    once it is final. Waiting costs no queries; see store.status_feed.
+    Under WSGI only the current status is sent, and the browser reconnects
+    after ``STATUS_REFRESH`` seconds.
+    """
+    order = await aget_object_or_404(Order.objects.only('id', 'status'), id=order_id)
+    if not status_feed.can_wait(request):
+        response = HttpResponse(
+            f"retry: {STATUS_REFRESH * 1000}\n" + status_event(order.status), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def events():
+        status = order.status
+        with status_feed.notifier.subscribe(order.id, status) as subscription:
+            yield "retry: 5000\n" + status_event(status)
+            while not status_feed.is_final(status):
+                try:
+                    changed = await subscription.get(STATUS_KEEPALIVE)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if changed != status:
+                    status = changed
+                    yield status_event(status)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
 
-    return render(request, 'store/invoice.html', context)
+async def order_status(request, order_id):
+    """
+    Long-poll fallback for clients without EventSource. With
+    ``?since=<status>`` the response waits until the status differs, or up
+    to ``STORE_ORDER_STATUS_TIMEOUT`` seconds, then returns it as JSON.
+    Under WSGI it never waits.
+    """
+    order = await aget_object_or_404(Order.objects.only('id', 'status'), id=order_id)
+    status = order.status
+    since = request.GET.get('since')
+    if status == since and not status_feed.is_final(status) and status_feed.can_wait(request):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'STORE_ORDER_STATUS_TIMEOUT', 25)
+        with status_feed.notifier.subscribe(order.id, status) as subscription:
+            while status == since:
+                try:
+                    status = await subscription.get(max(deadline - loop.time(), 0))
+                except TimeoutError:
+                    break
+    response = JsonResponse(status_payload(status))
+    response['Cache-Control'] = 'no-store'
+    return response
+
+# ---------------- Download Invoice ---------------- #
+def download_invoice(request, order_id):
+    order = get_object_or_404(Order, id=order_id)
+    if not invoices.has_stored_invoice(order):
+        # The invoice worker has not got to this order yet.
+        invoices.render_invoice(order)
+    return invoices.invoice_response(request, order)
 
 
 # ---------------- Payment Success ---------------- #
@@ -186,8 +292,155 @@ def payment_success(request):
     return render(request, 'store/order_success.html', {"order": order})
 
 # ---------------- My Orders ---------------- #
+ORDERS_PAGE_SIZE = 20
+ORDERS_MAX_PAGE_SIZE = 100
+
+def order_history(user):
+    # A correlated subquery rather than JOIN + GROUP BY, so only the rows on
+    # the requested page are counted and the index order is kept.
+    item_count = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Order.objects.filter(user=user).annotate(
+        item_count=Coalesce(Subquery(item_count), 0)
+    )
+
 @login_required
-def my_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'store/my_orders.html', {'orders': orders})
+async def my_orders(request):
+    try:
+        orders, next_cursor = await akeyset_page(
+            order_history(await request.auser()), request.GET.get('cursor'), ORDERS_PAGE_SIZE
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, 'store/my_orders.html', {'orders': orders, 'next_cursor': next_cursor})
+
+def my_orders_api(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    try:
+        page_size = min(int(request.GET.get('limit', ORDERS_PAGE_SIZE)), ORDERS_MAX_PAGE_SIZE)
+        orders, next_cursor = keyset_page(
+            order_history(request.user), request.GET.get('cursor'), max(page_size, 1)
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+    return JsonResponse({
+        "orders": [
+            {
+                "id": order.id,
+                "created_at": order.created_at.isoformat(),
+                "status": order.status,
+                "payment_status": order.payment_status,
+                "total_amount": str(order.total_amount),
+                "item_count": order.item_count,
+            }
+            for order in orders
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+# ---------------- Menu API ---------------- #
+MENU_API_FIELDS = {
+    'id': lambda item: item.id,
+    'name': lambda item: item.name,
+    'description': lambda item: item.description,
+    'price': lambda item: str(item.price),
+    'gst_rate': lambda item: str(item.gst_rate),
+    'category': lambda item: item.category.slug,
+    'image': lambda item: item.image.url if item.image else None,
+    'images': lambda item: {
+        width: default_storage.url(name)
+        for width, name in item.image_derivatives.get('webp', {}).items()
+    } if item.image and item.image_derivatives.get('source') == item.image.name else {},
+}
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+def menu_api_key(version, fields):
+    return f"store:menu-api:{version}:{','.join(fields)}"
+
+def menu_api_body(menu, fields):
+    """
+    ``(digest, plain body, gzipped body)``, cached per catalog version and
+    field set. The digest hashes the content rather than the version, which
+    each worker's cache seeds separately, so every worker gives the same
+    menu the same ETag.
+    """
+    key = menu_api_key(menu.version, fields)
+    bodies = cache.get(key)
+    if bodies is None:
+        payload = {
+            'categories': [{'name': c.name, 'slug': c.slug} for c in menu.categories],
+            'items': [{field: MENU_API_FIELDS[field](item) for field in fields} for item in menu.items],
+        }
+        content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+        digest = hashlib.sha256(content.encode()).hexdigest()[:20]
+        body = json.dumps({'version': digest, **payload}, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        bodies = (digest, body, gzip.compress(body, mtime=0))
+        cache.set(key, bodies, catalog.CATALOG_TIMEOUT)
+    return bodies
+
+def menu_etag(digest, encoding):
+    # Each encoding needs its own strong ETag; the digest already covers the field set.
+    return f'"menu-{digest}{"-gz" if encoding else ""}"'
+
+async def menu_api(request):
+    """
+    Categories and active menu items as JSON, for the mobile app.
+    ``?fields=id,name,price`` limits the item fields. The ETag is a digest
+    of the body, kept with it in the cache, so a poll with a current
+    ``If-None-Match`` is answered with 304 from two cache lookups.
+    """
+    fields = list(MENU_API_FIELDS)
+    if request.GET.get('fields'):
+        requested = set(request.GET['fields'].split(','))
+        if requested - set(MENU_API_FIELDS):
+            return JsonResponse(
+                {"error": "Unknown fields", "fields": sorted(requested - set(MENU_API_FIELDS))}, status=400
+            )
+        fields = [field for field in fields if field in requested]
+    encoding = 'gzip' if ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')) else None
+
+    bodies = await cache.aget(menu_api_key(await catalog.aget_version(), fields))
+    if bodies is None:
+        bodies = await sync_to_async(menu_api_body)(await catalog.aget_catalog(), fields)
+    digest, body, compressed = bodies
+    etag = menu_etag(digest, encoding)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(compressed if encoding else body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+# ---------------- Sales report ---------------- #
+@staff_member_required
+def sales_report(request):
+    """
+    Sales between ``?start=`` and ``?end=`` (ISO dates, inclusive; the last
+    30 days by default) as JSON, read from the daily rollups in
+    ``store.reports`` rather than from the orders.
+    """
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+    if start > end:
+        return JsonResponse({"error": "start is after end"}, status=400)
+    return JsonResponse({'start': start, 'end': end, **reports.sales_summary(start, end)}, encoder=DjangoJSONEncoder)
 
+# ---------------- Metrics ---------------- #
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(
+        metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
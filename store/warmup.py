@@ -0,0 +1,39 @@
+"""
+Work a fresh process would otherwise do on its first requests.
+
+``warm_up()`` builds the URL resolver's reverse lookup tables and compiles
+every store template into the (default) cached template loader. It touches
+neither the database nor the cache, so it is safe in a gunicorn master
+before forking; see ``gunicorn.conf.py``.
+"""
+import os
+from time import perf_counter
+
+from django.apps import apps
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+
+# Loaded by invoice workers only; compiling it elsewhere is wasted work.
+SKIP_TEMPLATES = {'store/invoice.html'}
+
+
+def store_templates():
+    root = os.path.join(apps.get_app_config('store').path, 'templates')
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            if name.endswith('.html'):
+                template = os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+                if template not in SKIP_TEMPLATES:
+                    yield template
+
+
+def warm_up():
+    """Return ``{'urls': seconds, 'templates': seconds}``."""
+    started = perf_counter()
+    # reverse() populates the resolver's lookup tables for every pattern.
+    reverse('home')
+    get_resolver().resolve('/')
+    urls_done = perf_counter()
+    for name in store_templates():
+        get_template(name)
+    return {'urls': urls_done - started, 'templates': perf_counter() - urls_done}